@@ -0,0 +1,100 @@
+import time
+from colour1593 import ColourPipeline
+
+
+# serial_read_1593 command that returns the 16-bit photoresistor
+# reading (only Teensy1 has the photoresistor, Teensy2 returns 0)
+BRIGHTNESS_COMMAND = b'B'
+PHOTORES_DEVICE_ID = 49
+PHOTORES_MAX_READING = 1023  # 10-bit analogRead
+
+
+class AmbientLightSampler:
+    """
+    Adjusts the display brightness to the ambient light level.
+
+    The photoresistor is read with the 'B' command in between frames
+    (see Display1593.start_ambient_light), so sampling never competes
+    with frame data for the serial port.  Readings are smoothed with
+    an exponential moving average and mapped linearly to a brightness
+    between min_brightness (dark room) and max_brightness, which is
+    then set on the colour pipeline's lookup tables.
+    """
+
+    def __init__(
+        self,
+        colour_pipeline: ColourPipeline,
+        interval: float = 1.0,
+        smoothing: float = 0.2,
+        dark_reading: int = 0,
+        bright_reading: int = PHOTORES_MAX_READING,
+        min_brightness: float = 0.1,
+        max_brightness: float = 1.0,
+        tolerance: float = 0.01
+    ):
+        """
+        Initialize the sampler.
+
+        Args:
+            colour_pipeline: ColourPipeline whose brightness is set
+            interval: Time between readings (seconds)
+            smoothing: Weight of each new reading in the moving
+                average (0 to 1)
+            dark_reading: Photoresistor reading at or below which
+                min_brightness is used
+            bright_reading: Photoresistor reading at or above which
+                max_brightness is used
+            min_brightness, max_brightness: Range of brightness
+                (0 to 1)
+            tolerance: Minimum change in brightness before the lookup
+                tables are updated
+        """
+        if bright_reading <= dark_reading:
+            raise ValueError("bright_reading must be greater than "
+                             "dark_reading")
+        self.colour_pipeline = colour_pipeline
+        self.interval = interval
+        self.smoothing = smoothing
+        self.dark_reading = dark_reading
+        self.bright_reading = bright_reading
+        self.min_brightness = min_brightness
+        self.max_brightness = max_brightness
+        self.tolerance = tolerance
+        self.next_sample_time = time.monotonic()
+        self.level = None  # Smoothed reading
+        self.readings = 0
+        self.read_errors = 0
+
+    def due(self) -> bool:
+        """True if it is time to take another reading."""
+        return time.monotonic() >= self.next_sample_time
+
+    def update(self, reading: int):
+        """
+        Add a new photoresistor reading.
+
+        Args:
+            reading: Raw reading (0 to PHOTORES_MAX_READING), or None
+                if the reading failed
+        """
+        self.next_sample_time = time.monotonic() + self.interval
+        if reading is None:
+            self.read_errors += 1
+            return
+        self.readings += 1
+        if self.level is None:
+            self.level = float(reading)
+        else:
+            self.level += self.smoothing * (reading - self.level)
+        brightness = self.brightness()
+        if abs(brightness - self.colour_pipeline.brightness) >= self.tolerance:
+            self.colour_pipeline.set_brightness(brightness)
+
+    def brightness(self) -> float:
+        """Brightness for the current smoothed reading."""
+        x = (self.level - self.dark_reading) / \
+            (self.bright_reading - self.dark_reading)
+        x = min(max(x, 0.0), 1.0)
+        return self.min_brightness + x * (
+            self.max_brightness - self.min_brightness
+        )
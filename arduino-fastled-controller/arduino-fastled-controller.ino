@@ -5,10 +5,14 @@
 #define NUM_LEDS    100      // Number of LEDs
 #define LED_TYPE    WS2811  // Change to your LED type (WS2812B, APA102, etc.)
 #define COLOR_ORDER RGB     // Change if your LEDs have different color order
+// Uncomment if gamma, color correction and brightness are applied
+// by the host (see colour1593.py) so the LED values are sent as is
+//#define HOST_COLOR_CORRECTION
 
 // Serial communication settings
 #define BAUD_RATE   921600  // High baud rate for faster data transfer
 #define HEADER_MARKER 0xAB  // Marker to identify start of frame
+#define SEQ_HEADER_MARKER 0xAC  // Start of frame followed by a sequence number
 
 // LED array
 CRGB leds[NUM_LEDS];
@@ -18,13 +22,26 @@ uint8_t serialBuffer[NUM_LEDS * 3 + 1]; // RGB data + header
 uint16_t bufferIndex = 0;
 bool frameStarted = false;
 
+// Sequence number of the current frame.  When frames are sent with
+// SEQ_HEADER_MARKER the host may have several frames in flight and
+// matches each ACK to a frame by the sequence number echoed after it.
+uint8_t frameSeq = 0;
+bool seqPending = false;
+bool ackWithSeq = false;
+
 void setup() {
   // Allow safe powerup
   delay(1000);
 
   // Initialize FastLED
+#ifdef HOST_COLOR_CORRECTION
+  FastLED.addLeds<LED_TYPE, LED_PIN, COLOR_ORDER>(leds, NUM_LEDS).setCorrection(UncorrectedColor);
+  FastLED.setBrightness(255);
+  FastLED.setDither(DISABLE_DITHER);
+#else
   FastLED.addLeds<LED_TYPE, LED_PIN, COLOR_ORDER>(leds, NUM_LEDS).setCorrection(TypicalLEDStrip);
   FastLED.setBrightness(50); // Set initial brightness (0-255)
+#endif
   FastLED.clear();
   FastLED.show();
 
@@ -57,10 +74,27 @@ void loop() {
     // Check for header marker
     if (inByte == HEADER_MARKER && !frameStarted) {
       frameStarted = true;
+      ackWithSeq = false;
       bufferIndex = 0;
       continue;
     }
 
+    // Check for header marker of a frame with a sequence number
+    if (inByte == SEQ_HEADER_MARKER && !frameStarted) {
+      frameStarted = true;
+      seqPending = true;
+      ackWithSeq = true;
+      bufferIndex = 0;
+      continue;
+    }
+
+    // First byte after SEQ_HEADER_MARKER is the sequence number
+    if (seqPending) {
+      frameSeq = inByte;
+      seqPending = false;
+      continue;
+    }
+
     // Store byte in buffer
     if (frameStarted && bufferIndex < NUM_LEDS * 3) {
       serialBuffer[bufferIndex++] = inByte;
@@ -72,6 +106,9 @@ void loop() {
 
         // Signal ready for next frame
         Serial.write('A'); // ACK
+        if (ackWithSeq) {
+          Serial.write(frameSeq);
+        }
         break;
       }
     }
@@ -0,0 +1,273 @@
+import asyncio
+import numpy as np
+from serial import SerialException
+from serial_utils import (
+    open_serial_connections, AsyncSerial, async_establish_communication
+)
+from display1593 import (
+    DEFAULT_BAUD_RATE, SERIAL_PORTS, LEDS_PER_STRIP, NOT_CONNECTED,
+    CONNECTED, COMMUNICATING, FAILED, make_segment_indices
+)
+
+
+class AsyncDisplay1593:
+    """
+    Asyncio version of the Display1593 controller.
+
+    All serial input/output is done with non-blocking file
+    descriptors on the running event loop, so frames are sent to
+    all Teensy devices concurrently without any extra threads and
+    the controller can share an event loop with other tasks.
+    """
+
+    def __init__(
+        self,
+        ports: dict = SERIAL_PORTS,
+        baud_rate: int = DEFAULT_BAUD_RATE,
+        leds_per_strip: dict = LEDS_PER_STRIP,
+    ):
+        """
+        Initialize the LED display controller.
+
+        Args:
+            ports: Dictionary of serial port names of each device
+            baud_rate: Serial baud rate (should match Arduino code)
+            leds_per_strip: Number of LEDs on each strip of each
+                device (see LEDS_PER_STRIP)
+        """
+        self.ports = ports
+        self.baud_rate = baud_rate
+        self.serial_conns = None
+        self.device_status = {device_id: NOT_CONNECTED for device_id in ports}
+        self.connection_errors = {}
+        self.header_marker = 0xAB  # Must match Arduino code
+        self.num_leds = sum(sum(n) for n in leds_per_strip.values())
+        self.segment_indices = make_segment_indices(leds_per_strip)
+
+    @property
+    def connected(self) -> bool:
+        """True if communication is established with all devices."""
+        return all(
+            status == COMMUNICATING for status in self.device_status.values()
+        )
+
+    async def connect(self, timeout: float = 5.0) -> bool:
+        """
+        Connect to the Teensy controllers.
+
+        The connection handshakes with all devices are done
+        concurrently.  If any device fails to connect, all the serial
+        ports are closed again, the devices that failed are given the
+        status FAILED (with the reason in self.connection_errors) and
+        a SerialException is raised.
+
+        Args:
+            timeout: Time to wait for each step of the handshake
+        """
+        serial_conns = open_serial_connections(
+            self.ports, baud_rate=self.baud_rate
+        )
+        self.serial_conns = {
+            device_id: AsyncSerial(serial_conn)
+            for device_id, serial_conn in serial_conns.items()
+        }
+        for device_id in self.serial_conns:
+            self.device_status[device_id] = CONNECTED
+        errors = {
+            device_id: "failed to open serial port"
+            for device_id in self.ports if device_id not in self.serial_conns
+        }
+        if len(errors) == 0:
+            results = await asyncio.gather(*[
+                async_establish_communication(aser, timeout=timeout)
+                for aser in self.serial_conns.values()
+            ], return_exceptions=True)
+            for device_id, result in zip(self.serial_conns, results):
+                if isinstance(result, Exception):
+                    errors[device_id] = f"error connecting to device: {result}"
+                    continue
+                status, device_id_reported, msg = result
+                if status > 0:
+                    errors[device_id] = msg
+                elif device_id_reported != device_id:
+                    errors[device_id] = \
+                        f"device reported id {device_id_reported}"
+                else:
+                    self.device_status[device_id] = COMMUNICATING
+        if len(errors) > 0:
+            for device_id, aser in self.serial_conns.items():
+                aser.close()
+                self.device_status[device_id] = NOT_CONNECTED
+            for device_id in errors:
+                self.device_status[device_id] = FAILED
+            self.connection_errors = errors
+            raise SerialException(
+                "Failed to connect to devices: " + ", ".join(
+                    f"device {device_id}: {msg}"
+                    for device_id, msg in errors.items()
+                )
+            )
+        return True
+
+    def disconnect(self):
+        """Disconnect from the Teensy controllers."""
+        for device_id, aser in self.serial_conns.items():
+            if aser.ser.is_open:
+                aser.close()
+                self.device_status[device_id] = NOT_CONNECTED
+
+    async def send_frame(
+        self,
+        frame: np.ndarray,
+        wait_for_ack: bool = True
+    ) -> bool:
+        """
+        Send a single frame to the LED display.
+
+        The frame is split into one segment per Teensy device and
+        the segments are sent to all devices concurrently.
+
+        Args:
+            frame: Numpy array with shape (num_leds, 3) containing RGB
+                values (0-255)
+            wait_for_ack: Whether to wait for acknowledgment from Arduino
+
+        Returns:
+            True if frame was sent successfully, False otherwise
+        """
+        if not self.connected:
+            print("Not connected to Arduino")
+            return False
+
+        # Ensure frame has the right dimensions
+        if frame.shape != (self.num_leds, 3):
+            print(f"Frame has wrong dimensions: {frame.shape}, expected "\
+                  f"{(self.num_leds, 3)}")
+            return False
+
+        frame = frame.astype(np.uint8, copy=False)
+        results = await asyncio.gather(*[
+            self.send_segment(
+                device_id,
+                frame.take(segment_index, axis=0),
+                wait_for_ack
+            )
+            for device_id, segment_index in self.segment_indices.items()
+        ])
+        return all(results)
+
+    async def send_segment(
+        self,
+        device_id: int,
+        segment: np.ndarray,
+        wait_for_ack: bool = True
+    ) -> bool:
+        """
+        Send one device's segment of a frame.
+
+        Args:
+            device_id: Id of the device to send the segment to
+            segment: Numpy array with shape (n, 3) containing the RGB
+                values (0-255) of the LEDs connected to the device
+            wait_for_ack: Whether to wait for acknowledgment from Arduino
+
+        Returns:
+            True if segment was sent successfully, False otherwise
+        """
+        aser = self.serial_conns[device_id]
+        try:
+            await aser.write(bytes([self.header_marker]) + segment.tobytes())
+
+            # Wait for acknowledgment if required
+            if wait_for_ack:
+                loop = asyncio.get_running_loop()
+                deadline = loop.time() + 1.0
+                while True:
+                    ack_byte = await aser.read(
+                        1, timeout=max(0.0, deadline - loop.time())
+                    )
+                    if ack_byte == b'A':
+                        return True
+                    if not ack_byte:
+                        break
+                print(f"Device {device_id}: Timed out waiting for frame "
+                      "acknowledgment")
+                return False
+
+            return True
+
+        except Exception as e:
+            print(f"Device {device_id}: Error sending frame: {e}")
+            return False
+
+    async def play_video(
+        self,
+        video_data: np.ndarray,
+        fps: int = 24,
+        loop: bool = False
+    ) -> None:
+        """
+        Play a video on the LED display.
+
+        Frames are paced against the event loop clock so other tasks
+        keep running between frames.
+
+        Args:
+            video_data: Numpy array with shape (frames, num_leds, 3)
+            fps: Frames per second to play at
+            loop: Whether to loop the video
+        """
+        if video_data.shape[0] == 0:
+            raise ValueError("video_data has no frames")
+        if not self.connected:
+            print("Not connected to Arduino")
+            return
+
+        event_loop = asyncio.get_running_loop()
+        frame_time = 1.0 / fps
+        next_frame_time = event_loop.time()
+
+        playing = True
+        while playing:
+            for frame_idx in range(video_data.shape[0]):
+
+                # Send the frame
+                success = await self.send_frame(video_data[frame_idx])
+                if not success:
+                    print(f"Failed to send frame {frame_idx}")
+                    playing = False
+                    break
+
+                # Wait until it is time for the next frame.  If
+                # playback has fallen behind, carry on from now rather
+                # than sending the late frames back-to-back
+                next_frame_time += frame_time
+                now = event_loop.time()
+                if next_frame_time < now:
+                    next_frame_time = now
+                await asyncio.sleep(max(0.0, next_frame_time - now))
+
+            if not loop:
+                break
+
+
+# Example usage
+if __name__ == "__main__":
+
+    async def main():
+        # Replace with your Teensy serial ports (see SERIAL_PORTS)
+        controller = AsyncDisplay1593()
+        try:
+            await controller.connect()
+            video = np.zeros((100, controller.num_leds, 3), dtype=np.uint8)
+            video[:, :, 0] = np.arange(100, dtype=np.uint8)[:, None]
+            print("Playing test pattern...")
+            await controller.play_video(video, fps=24, loop=True)
+        finally:
+            if controller.serial_conns is not None:
+                controller.disconnect()
+
+    try:
+        asyncio.run(main())
+    except KeyboardInterrupt:
+        print("Program stopped by user")
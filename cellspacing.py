@@ -11,6 +11,7 @@ from scipy.optimize import minimize
 from scipy.spatial import KDTree
 import graphics as gr
 import datetime
+import timeit
 import socket
 from random import shuffle
 
@@ -62,9 +63,12 @@ class CellArray:
         # Not sure if its necessary to initialise these pointers
         # here as they will be assigned to data by functions later
         self.KDTree = None
+        self.KDTreeCellIds = None
+        self.cellList = None
         self.nearestNeighboursVec = np.zeros((n, nn))
         self.nearestNeighbourDistanceVec = np.zeros((n, nn))
         self.nearestNeighbourGapVec = np.zeros((n, nn))
+        self.nearestNeighbourOffsetVec = np.zeros((n, nn, 2))
 
         # The following matrix is used by functions such as errorFunction
         # to keep x, y co-ordinates (self.centresVec) within the cell array
@@ -89,6 +93,16 @@ class CellArray:
 
         self.cellDensitiesAtGridPoints = np.zeros((w/gs, h/gs))
 
+        # Settings for the periodic cell list used for the neighbour
+        # and density queries (see PeriodicCellList).  The bin size
+        # is the radius of the density calculation areas so those
+        # queries only need to search the 3 x 3 bins around each
+        # grid point.  If more than the rebuild threshold (fraction
+        # of all cells) move to a different bin the cell list is
+        # re-built instead of being updated
+        self.cellListBinSize = self.areaRadiusFactor*self.gridSpacing
+        self.cellListRebuildThreshold = 0.25
+
     def addCell(self):
         """Function to add one new cell"""
         newPoint = self.findLowDensityPoint()
@@ -116,55 +130,74 @@ class CellArray:
         self.m = np.concatenate((np.repeat(self.width, self.numCells), \
                     np.repeat(self.height, self.numCells)))
 
+    def updateCellList(self):
+        """Bring the periodic cell list up to date with the current
+        cell positions (only the cells that have moved to a different
+        bin are updated).  Creates the cell list if necessary."""
+
+        xy = np.transpose(self.centresVec.reshape((2, self.numCells)))
+        if self.cellList is None:
+            self.cellList = PeriodicCellList(self.width, self.height, \
+                                self.cellListBinSize, \
+                                self.cellListRebuildThreshold)
+        self.cellList.update(xy)
+
+        return xy
+
     def calculateNearestNeighbours(self):
         """Function to calculate nearest n neighbours to each cell"""
 
-        # query the tree with the sequence of (x, y) cordinates of
+        # query the cell list with the (x, y) cordinates of
         # all cells
-        q = self.KDTree.query(self.sequenceOfXY(), k=1 + self.numNeighbours)
+        xy = self.updateCellList()
+        q = self.cellList.queryNearest(xy, 1 + self.numNeighbours)
 
         # assign two class variables to results after removing
         # the first query result for each cell which is the
         # cell itself (distance = 0) not the nearest neighbour
         self.nearestNeighbourDistanceVec = q[0][:, 1:]
-        self.nearestNeighboursVec = q[1][:, 1:] % self.numCells
+        self.nearestNeighboursVec = q[1][:, 1:]
 
-        # If using the range function with the cell gap calculation
-        # include the following code to populate the gap matrix with
-        # the sum of the radii of current cell and each nearest neighbour
-        # minus the distance to each neighbour
-        # (uses a python iterable to walk through the matrix):
-        it = np.nditer(self.nearestNeighbourGapVec, flags=['multi_index'], op_flags=['writeonly'])
-        while not it.finished:
+        # Vectors from each cell to (the nearest periodic image of)
+        # each of its neighbours.  These are needed for the cost
+        # function gradient because a neighbour may be on the other
+        # side of the array
+        self.nearestNeighbourOffsetVec = q[2][:, 1:]
 
-            # it.multi_index[0] is the row index
-            r = it.multi_index[0]
+        self.calculateNearestNeighbourGaps()
 
-            # it.multi_index[1] is the column index
-            c = it.multi_index[1]
+    def calculateNearestNeighbourGaps(self):
+        """Populate the gap matrix with the distance to each nearest
+        neighbour minus the sum of the radii of the current cell and
+        the neighbour."""
 
-            # it[0] is the matrix element's value
-            it[0] = self.nearestNeighbourDistanceVec[r][c] \
-                    - self.radiiVec[self.nearestNeighboursVec[r][c]] \
-                    - self.radiiVec[r]
-            it.iternext()
+        # Calculated in place in the preallocated matrix (it is only
+        # re-allocated if the number of cells changes)
+        gaps = self.nearestNeighbourGapVec
+        if gaps.shape != self.nearestNeighbourDistanceVec.shape:
+            gaps = np.empty(self.nearestNeighbourDistanceVec.shape)
+            self.nearestNeighbourGapVec = gaps
+        np.take(self.radiiVec, self.nearestNeighboursVec, out=gaps)
+        np.subtract(self.nearestNeighbourDistanceVec, gaps, out=gaps)
+        gaps -= self.radiiVec[:, np.newaxis]
 
 
     def calculateCellsWithinRange(self, pt, r):
         """Function to find all cells within a range r of point x, y
         Returns list of cell IDs"""
 
+        # Translate the ids of ghost cells to the ids of the real cells
         q = self.KDTree.query_ball_point(pt, r)
 
-        return q
+        return [self.KDTreeCellIds[i] for i in q]
 
     def calculateNearestCell(self, pt):
         """ Function to find the nearest cell to point x, y
-        Returns cell ID and distance """
+        Returns distance and cell ID """
 
         q = self.KDTree.query(pt)
 
-        return q
+        return q[0], self.KDTreeCellIds[q[1]]
 
     def cellDensity(self):
         """ Calculate the overall (average) density of cells in the array """
@@ -186,20 +219,27 @@ class CellArray:
         # to a sequence of points (x, y) covering the area of the
         # cell array.  Function sequenceOfXYRegularGrid() should
         # have been called during the CellArray class initialisation.
-        # Also assumes the KDTree has been created and self.KDTree
-        # assigned to it
 
         # Radius of the circular areas is defined by
         r = self.areaRadiusFactor*self.gridSpacing
 
-        tree = self.KDTree
-        q = tree.query(self.gridPoints, k=self.numCells, \
-                          distance_upper_bound=r)
-
-        cellAreas = np.sum( \
-            vOverlappingAreaOfTwoCircles(self.avgRadius, \
-                                         r, \
-                                         q[0]), axis=1)
+        # Find the cells within each grid point's circle and make a
+        # list of all the (grid point, cell) pairs with the vectors
+        # from the grid points to (the nearest periodic image of) the
+        # cells.  The pairs are also used by the cost function
+        # gradient
+        self.updateCellList()
+        gridXY = np.asarray(self.gridPoints, dtype=float)
+        self.densityPairGridIds, self.densityPairCellIds, \
+            self.densityPairOffsets, self.densityPairDistances = \
+            self.cellList.queryRadius(gridXY, r)
+
+        # Sum the areas of overlap of the cells with each circle
+        cellAreas = np.bincount(self.densityPairGridIds, \
+            weights=overlappingAreasOfTwoCircles(self.avgRadius, \
+                                                 r, \
+                                                 self.densityPairDistances), \
+            minlength=len(gridXY))
 
         self.cellDensitiesAtGridPoints = \
                     cellAreas / (np.pi*(r**2))
@@ -208,10 +248,12 @@ class CellArray:
     def createKDTree(self):
         """Creates a KDTree from a sequence of cell (x, y) co-ordinates
         using the SciPy spatial algorithm KDTree()."""
-        # See also function self.sequenceOfXYExtended_old() which prepares an
-        # extended sequence of cell (x, y) co-ordinates
+        # See also function self.sequenceOfXYExtended() which prepares an
+        # extended sequence of cell (x, y) co-ordinates and the ids of
+        # the cells they are copies of
 
-        self.KDTree = KDTree(self.sequenceOfXYExtended_old())
+        xy, self.KDTreeCellIds = self.sequenceOfXYExtended()
+        self.KDTree = KDTree(xy)
 
 
     def sequenceOfXY(self):
@@ -221,22 +263,25 @@ class CellArray:
         return zip(self.centresVec[0:self.numCells], self.centresVec[self.numCells:])
 
 
-    # BIG ISSUE WITH THIS FUNCTION: Because a reduced set of adjacent ghost
-    # cells is used the ids of these do not map to the main cells using the
-    # modulus function:
-    #   original_cellID = ghost_cellID % self.numCells
-    # So I have temporarily switched back to using the old version of this
-    # function below.
+    # Because a reduced set of adjacent ghost cells is used the ids of
+    # these do not map to the main cells using the modulus function.
+    # This function therefore also returns the id of the original cell
+    # of each point, which createKDTree() keeps in self.KDTreeCellIds.
+    # The old version below is no longer used.
     def sequenceOfXYExtended(self):
         """Function to prepare an extended sequence of cell (x, y) co-ordinates
         which can be used to generate the KDTree for nearest neighbour searches
         with 'ghost cells' on all sides to create the effect of an infinite
-        (tessellating) array space."""
+        (tessellating) array space.
+        Returns the (x, y) co-ordinates and an array of the ids of the
+        cells they belong to (ghost cells map to their original cell)."""
 
         n = self.numCells
         w = self.width
         h = self.height
 
+        # Only cells within bufferSize of the edges of the array are
+        # replicated so queries are only correct up to this distance
         bufferSize = max(self.avgRadius*4, \
                         self.areaRadiusFactor*self.gridSpacing)
 
@@ -245,73 +290,31 @@ class CellArray:
         # the SciPy KDTree function
         xy = np.transpose(self.centresVec.reshape((2, n)))
 
-        # Create a logical mask of which points need replicating
-        # to the left of the cell array
-        iterable = ((p[0] > (w - bufferSize)) for p in xy)
-        xh = np.fromiter(iterable, np.bool)
-
-        # Create a logical mask of which points need replicating
-        # to the right of the cell array
-        iterable = ((p[0] < bufferSize) for p in xy)
-        xl = np.fromiter(iterable, np.bool)
-
-        # Create a logical mask of which points need replicating
-        # below the cell array
-        iterable = ((p[1] > (h - bufferSize)) for p in xy)
-        yh = np.fromiter(iterable, np.bool)
-
-        # Create a logical mask of which points need replicating
-        # above the cell array
-        iterable = ((p[1] < bufferSize) for p in xy)
-        yl = np.fromiter(iterable, np.bool)
-
-        # Create additional masks from combinations of above
-        xm = np.any([xh, xl], axis=0)
-        ym = np.any([yh, yl], axis=0)
-        xym = np.all([xm, ym], axis=0)
-
-        # Calculate the number of extra points that
-        # will need to be added to the x-y matrix
-        xn = sum(xm)
-        yn = sum(ym)
-        xyn = sum(xym)
-
-        # Create a new array of sufficient size to accommodate the
-        # extended set of x-y co-ordinates
-        newXY = np.append(xy, np.zeros((xn + yn + xyn, 2)), 0)
-
-        i = n
-
-        # Construct additional arrays of the x-y co-ordinates
-        # of the additional points
-        test1 = xy[xl] + np.array((w, 0.0))
-        test2 = xy[xh] - np.array((w, 0.0))
-        test3 = xy[yl] + np.array((0.0, h))
-        test4 = xy[yh] - np.array((0.0, h))
-
-        # Copy the additional co-ordinates to the main array
-        for j, el in enumerate(test1):
-            newXY[i] = el
-            i += 1
-
-        for j, el in enumerate(test2):
-            newXY[i] = el
-            i += 1
-
-        for j, el in enumerate(test3):
-            newXY[i] = el
-            i += 1
-
-        for j, el in enumerate(test4):
-            newXY[i] = el
-            i += 1
-
-        for j, el in enumerate(xm & ym):
-            if el:
-                newXY[i] = xy[j] + np.array((w*xl[j], h*yl[j])) - np.array((w*xh[j], h*yh[j]))
-                i += 1
-
-        return newXY
+        # Logical masks of which points need replicating to the
+        # left, right, above and below the cell array (the ghost
+        # cells to the right are copies of the cells on the left
+        # edge etc.)
+        xMasks = {-1: xy[:, 0] > (w - bufferSize), \
+                   0: np.ones(n, dtype=bool), \
+                   1: xy[:, 0] < bufferSize}
+        yMasks = {-1: xy[:, 1] > (h - bufferSize), \
+                   0: np.ones(n, dtype=bool), \
+                   1: xy[:, 1] < bufferSize}
+
+        # The real cells come first so their ids are unchanged, then
+        # the ghost cells in the eight tiles around the array (in the
+        # same order as sequenceOfXYExtended_old())
+        sequences = [xy]
+        cellIds = [np.arange(n)]
+        for dy in (-1, 0, 1):
+            for dx in (-1, 0, 1):
+                if dx == 0 and dy == 0:
+                    continue
+                ids = np.nonzero(xMasks[dx] & yMasks[dy])[0]
+                sequences.append(xy[ids] + np.array((dx*w, dy*h)))
+                cellIds.append(ids)
+
+        return np.concatenate(sequences), np.concatenate(cellIds)
 
 
     # THIS IS THE ORIGINAL VERSION OF THE FUNCTION ABOVE THAT IS
@@ -327,7 +330,8 @@ class CellArray:
     def sequenceOfXYExtended_old(self):
         """ORIGINAL VERSION OF sequenceOfXYExtended(). Inefficienct but the
         new version does not provide correct cell ID numbers to the KD Tree
-        so this version is now back in use as of October 2015."""
+        so this version is now back in use as of October 2015.
+        No longer used: sequenceOfXYExtended() now returns the cell IDs."""
 
         n = self.numCells
 
@@ -376,7 +380,7 @@ class CellArray:
 
         else:
 
-            # Re-build the extended KDTree
+            # Re-build the extended KDTree (used by calculateNearestCell)
             self.createKDTree()
 
             # Re-calculate the cell densities
@@ -454,9 +458,9 @@ class CellArray:
         # y mod cellArray.height
         self.centresVec = x % self.m
 
-        # Re-build the extended KDTree (decided this does not need re-building
-        # every iteration)
-        self.createKDTree()
+        # The KDTree is no longer re-built here.  The nearest neighbour
+        # and density calculations use the periodic cell list which
+        # only updates the cells that have moved to a different bin
 
         # Re-calculate the nearest neighbours and distances
         self.calculateNearestNeighbours()
@@ -484,12 +488,61 @@ class CellArray:
                         + 100.0*stDevOfCellDensity**2
 
 
+    def calculateCostFunctionAndGradient(self, x):
+        """Re-calculates total cost function and its gradient when given
+        a vector of the x, y co-ordinates of all cells.  For use with
+        optimizers that take a jacobian (e.g. L-BFGS-B)."""
+
+        cost = self.calculateCostFunction(x)
+
+        return cost, self.costFunctionDerivative()
+
+
     def costFunctionDerivative(self):
         """Calculates the derivates (gradients) of the above
-        cost function for all (x, y) parameters."""
+        cost function for all (x, y) parameters.  Assumes the cost
+        function has just been calculated for the current cell
+        positions.  Returns a vector in the same order as
+        self.centresVec."""
 
-        return sigmoidDerivative(self.nearestNeighbourGapVec) \
-                        /self.nearestNeighbourDistanceVec
+        n = self.numCells
+        gradient = np.zeros((2, n))
+
+        # Cell range term: each pair of neighbours contributes
+        # f(d) = sigmoid(gap)/d where gap = d - radius1 - radius2.
+        # Moving a cell towards its neighbour reduces d by the
+        # component of the movement along the unit vector u between
+        # them
+        d = self.nearestNeighbourDistanceVec
+        s = self.sigmoidFunction(self.nearestNeighbourGapVec)
+        dfdd = self.sigmoidDerivative(self.nearestNeighbourGapVec)/d - s/d**2
+        f = (dfdd/d)[:, :, np.newaxis]*self.nearestNeighbourOffsetVec
+        neighbours = self.nearestNeighboursVec.ravel()
+        for i in range(2):
+            gradient[i] -= np.sum(f[:, :, i], axis=1)
+            gradient[i] += np.bincount(neighbours, \
+                                       weights=f[:, :, i].ravel(), \
+                                       minlength=n)
+
+        # Cell density term: 100*var(densities) where the density at
+        # each grid point is the sum of the areas of overlap of the
+        # cells with a circle of radius r around the grid point
+        r = self.areaRadiusFactor*self.gridSpacing
+        densities = self.cellDensitiesAtGridPoints
+        dCostdDensity = 100.0*2.0*(densities - np.mean(densities)) \
+                        /len(densities)
+        d = self.densityPairDistances
+        dAreadd = dOverlappingAreaOfTwoCircles(self.avgRadius, r, d)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            w = np.where(d > 0.0, dCostdDensity[self.densityPairGridIds] \
+                         *dAreadd/(np.pi*r**2)/d, 0.0)
+        offsets = self.densityPairOffsets
+        for i in range(2):
+            gradient[i] += np.bincount(self.densityPairCellIds, \
+                                       weights=w*offsets[:, i], \
+                                       minlength=n)
+
+        return gradient.ravel()
 
 
     def sigmoidFunction(self, x):
@@ -505,9 +558,11 @@ class CellArray:
         return -s*(1.0 - s)
 
 
-    def adjustCellPositions(self, nIters):
+    def adjustCellPositions(self, nIters, method='Powell'):
         """Run optimization function to adjust cell positions according
-        to error function."""
+        to error function.  method is 'Powell' (no derivatives) or
+        'L-BFGS-B' (uses the analytic gradient of the cost function
+        and needs far fewer cost function evaluations)."""
 
         # Nelder-Mead / Powell optimization function
         # Here are the results of convergence tests with 100 cells
@@ -530,16 +585,262 @@ class CellArray:
         #  Nelder-Mead  3.4%
         #
 
-        res = minimize(self.calculateCostFunction, self.centresVec, \
-                    method='Powell', \
-                    options={'disp': False, 'maxiter': nIters} \
-                    )
+        if method == 'L-BFGS-B':
+            res = minimize(self.calculateCostFunctionAndGradient, \
+                        self.centresVec, \
+                        method='L-BFGS-B', jac=True, \
+                        options={'disp': False, 'maxiter': nIters} \
+                        )
+        else:
+            res = minimize(self.calculateCostFunction, self.centresVec, \
+                        method='Powell', \
+                        options={'disp': False, 'maxiter': nIters} \
+                        )
 
         # final call to errorFunction to store result in
         # self.centresVec
         return self.calculateCostFunction(res.x)
 
 
+class PeriodicCellList:
+    """Periodic cell list for neighbour searches in a CellArray.
+
+    The array area is divided into a uniform grid of bins which wraps
+    around at the edges, so no 'ghost' cells are needed to create the
+    effect of an infinite (tessellating) array space.  Distances and
+    offsets are calculated to the nearest periodic image of each cell.
+
+    Each bin holds the ids of its cells in a row of self.bins (-1 for
+    empty slots).  When the cells move, only the ones that have moved
+    to a different bin are updated, unless more than rebuildThreshold
+    (fraction of all cells) have moved, in which case the bins are
+    re-built from scratch."""
+
+    def __init__(self, w, h, binSize, rebuildThreshold=0.25):
+        """Initialize cell list.
+        w, h: width and height of the array area
+        binSize: minimum width and height of the bins
+        rebuildThreshold: fraction of cells changing bins above which
+        the cell list is re-built rather than updated."""
+
+        self.width = float(w)
+        self.height = float(h)
+        self.nx = max(1, int(self.width // binSize))
+        self.ny = max(1, int(self.height // binSize))
+        self.binWidth = self.width/self.nx
+        self.binHeight = self.height/self.ny
+        self.rebuildThreshold = rebuildThreshold
+
+        self.xy = None
+        self.bins = None
+        self.binCounts = None
+        self.binOfCell = None
+        self.slotOfCell = None
+
+        # Counters to monitor how often the cell list is re-built
+        self.rebuilds = 0
+        self.cellsMoved = 0
+
+    def binIds(self, xy):
+        """Returns the bin id of each of the (x, y) points in xy."""
+
+        i = np.floor(xy[:, 0]/self.binWidth).astype(int) % self.nx
+        j = np.floor(xy[:, 1]/self.binHeight).astype(int) % self.ny
+
+        return i*self.ny + j
+
+    def rebuild(self, xy):
+        """Re-build the bins from scratch for cell positions xy."""
+
+        n = len(xy)
+        self.xy = np.array(xy, dtype=float)
+        b = self.binIds(self.xy)
+        counts = np.bincount(b, minlength=self.nx*self.ny)
+
+        # Position (slot) of each cell within its bin.  Leave space
+        # in each bin for cells moving in
+        order = np.argsort(b, kind='mergesort')
+        starts = np.cumsum(counts) - counts
+        slots = np.empty(n, dtype=int)
+        slots[order] = np.arange(n) - starts[b[order]]
+        capacity = max(4, 2*counts.max())
+
+        self.bins = -np.ones((self.nx*self.ny, capacity), dtype=int)
+        self.bins[b, slots] = np.arange(n)
+        self.binCounts = counts
+        self.binOfCell = b
+        self.slotOfCell = slots
+        self.rebuilds += 1
+
+    def update(self, xy):
+        """Update the cell list with new cell positions xy.  Only
+        the cells that have moved to a different bin are moved."""
+
+        if self.xy is None or len(xy) != len(self.xy):
+            self.rebuild(xy)
+            return
+
+        self.xy[:] = xy
+        b = self.binIds(self.xy)
+        moved = np.nonzero(b != self.binOfCell)[0]
+        if len(moved) > self.rebuildThreshold*len(xy):
+            self.rebuild(xy)
+            return
+
+        capacity = self.bins.shape[1]
+        for c in moved:
+
+            # Remove cell from its old bin by moving the last cell
+            # in the bin into its slot
+            old = self.binOfCell[c]
+            slot = self.slotOfCell[c]
+            last = self.binCounts[old] - 1
+            other = self.bins[old, last]
+            self.bins[old, slot] = other
+            self.slotOfCell[other] = slot
+            self.bins[old, last] = -1
+            self.binCounts[old] = last
+
+            # Add it to the end of its new bin
+            new = b[c]
+            if self.binCounts[new] == capacity:
+                self.rebuild(xy)
+                return
+            self.bins[new, self.binCounts[new]] = c
+            self.slotOfCell[c] = self.binCounts[new]
+            self.binCounts[new] += 1
+            self.binOfCell[c] = new
+
+        self.cellsMoved += len(moved)
+
+    def candidates(self, pts, rings):
+        """Find the cells in the bins within rings bins of each point.
+        Returns two arrays listing the (point id, cell id) pairs,
+        grouped by point."""
+
+        b = self.binIds(pts)
+        i = (b // self.ny)[:, np.newaxis]
+        j = (b % self.ny)[:, np.newaxis]
+
+        # Offsets to the surrounding bins (each bin only once if
+        # the rings wrap all the way around)
+        di = np.unique(np.arange(-rings, rings + 1) % self.nx)
+        dj = np.unique(np.arange(-rings, rings + 1) % self.ny)
+        nbrs = (((i + di) % self.nx)[:, :, np.newaxis]*self.ny \
+                + ((j + dj) % self.ny)[:, np.newaxis, :]).ravel()
+
+        # Cells fill the first binCounts slots of each bin so the
+        # cells of all the bins can be gathered in one go
+        counts = self.binCounts[nbrs]
+        total = counts.sum()
+        slots = np.arange(total) - np.repeat(np.cumsum(counts) - counts, \
+                                             counts)
+        cellIds = self.bins[np.repeat(nbrs, counts), slots]
+        pointIds = np.repeat(np.arange(len(pts)), \
+                             counts.reshape(len(pts), -1).sum(axis=1))
+
+        return pointIds, cellIds
+
+    def coverage(self, rings, pts=None):
+        """Distance from any point (or from each of the points pts)
+        within which all cells are found by candidates(pts, rings)."""
+
+        d = np.inf
+        if pts is not None:
+            d = np.repeat(np.inf, len(pts))
+        for size, num, p in ((self.binWidth, self.nx, 0), \
+                             (self.binHeight, self.ny, 1)):
+            if 2*rings + 1 >= num:
+                continue
+            if pts is None:
+                d = min(d, rings*size)
+            else:
+                f = pts[:, p]/size
+                f = np.minimum(f - np.floor(f), np.ceil(f) - f)
+                d = np.minimum(d, (rings + f)*size)
+
+        return d
+
+    def offsets(self, pts, ids):
+        """Returns the vectors from the points pts to the nearest
+        periodic images of the cells ids."""
+
+        d = self.xy[ids] - pts
+        d[..., 0] -= self.width*np.round(d[..., 0]/self.width)
+        d[..., 1] -= self.height*np.round(d[..., 1]/self.height)
+
+        return d
+
+    def queryRadius(self, pts, r):
+        """Find all the cells within distance r of the points pts.
+        Returns arrays of the point ids, cell ids, offsets (from point
+        to cell) and distances of every (point, cell) pair found."""
+
+        rings = 1
+        while self.coverage(rings) < r:
+            rings += 1
+
+        pointIds, cellIds = self.candidates(pts, rings)
+        offsets = self.offsets(pts[pointIds], cellIds)
+        distances = np.hypot(offsets[:, 0], offsets[:, 1])
+        found = distances <= r
+
+        return pointIds[found], cellIds[found], offsets[found], \
+               distances[found]
+
+    def queryNearest(self, pts, k):
+        """Find the nearest k cells to each of the points pts.
+        Returns arrays of the distances, cell ids and offsets (from
+        point to cell) with shapes (len(pts), k), (len(pts), k) and
+        (len(pts), k, 2) sorted by distance."""
+
+        n = len(pts)
+        distances = np.empty((n, k))
+        cellIds = np.empty((n, k), dtype=int)
+
+        # Start by searching the bins within the distance that k cells
+        # would take up on average, then add another ring of bins for
+        # the points whose k nearest cells might be further away
+        pending = np.arange(n)
+        r = np.sqrt(k*self.width*self.height/(np.pi*len(self.xy)))
+        rings = 1
+        while self.coverage(rings) < r:
+            rings += 1
+        while len(pending) > 0:
+            p = pts[pending]
+            pointIds, ids = self.candidates(p, rings)
+            offsets = self.offsets(p[pointIds], ids)
+
+            # Arrange the candidates in a table with one row per
+            # point (padded with infinite distances)
+            counts = np.bincount(pointIds, minlength=len(p))
+            cols = np.arange(len(ids)) - np.repeat(np.cumsum(counts) \
+                                                   - counts, counts)
+            dist = np.empty((len(p), max(k, counts.max())))
+            dist.fill(np.inf)
+            dist[pointIds, cols] = np.hypot(offsets[:, 0], offsets[:, 1])
+            table = np.zeros(dist.shape, dtype=int)
+            table[pointIds, cols] = ids
+
+            nearest = np.argpartition(dist, k - 1, axis=1)[:, :k]
+            nearest = np.take_along_axis(nearest, np.argsort( \
+                np.take_along_axis(dist, nearest, axis=1), axis=1), axis=1)
+            dist = np.take_along_axis(dist, nearest, axis=1)
+
+            done = dist[:, -1] <= self.coverage(rings, p)
+            if self.coverage(rings) == np.inf:
+                done[:] = True
+            distances[pending[done]] = dist[done]
+            cellIds[pending[done]] = \
+                np.take_along_axis(table, nearest, axis=1)[done]
+            pending = pending[~done]
+            rings += 1
+
+        offsets = self.offsets(pts[:, np.newaxis, :], cellIds)
+
+        return distances, cellIds, offsets
+
+
 # ------------------------ GENERAL FUNCTIONS ---------------------
 
 def overlappingAreaOfTwoCircles(r, R, d):
@@ -569,9 +870,97 @@ def overlappingAreaOfTwoCircles(r, R, d):
         R**2*np.arccos((d**2 + R**2 - r**2)/(2.0*d*R)) - \
         0.5*np.sqrt((-d + r + R)*(d + r - R)*(d - r + R)*(d + r + R))
 
+def overlappingAreasOfTwoCircles(r, R, d):
+    """ Array version of overlappingAreaOfTwoCircles() where d
+    can be an array of distances.  Returns an array of areas."""
+
+    d = np.asarray(d, dtype=float)
+    rMin = min(r, R)
+    partial = (d < (r + R)) & (d > abs(R - r))
+
+    # Only calculate the lens areas where the circles partially
+    # overlap (the arccos arguments are clipped to keep the other
+    # elements finite)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        a1 = np.clip((d**2 + r**2 - R**2)/(2.0*d*r), -1.0, 1.0)
+        a2 = np.clip((d**2 + R**2 - r**2)/(2.0*d*R), -1.0, 1.0)
+        product = np.where(partial, \
+                           (-d + r + R)*(d + r - R)*(d - r + R)*(d + r + R), \
+                           0.0)
+        lens = r**2*np.arccos(a1) + R**2*np.arccos(a2) \
+               - 0.5*np.sqrt(product)
+
+    return np.where(partial, lens, \
+                    np.where(d <= abs(R - r), np.pi*rMin**2, 0.0))
+
 # Vectorized version of the above function to return the
-# area of overlap of two circles
-vOverlappingAreaOfTwoCircles = np.vectorize(overlappingAreaOfTwoCircles)
+# area of overlap of two circles (previously np.vectorize of
+# overlappingAreaOfTwoCircles)
+vOverlappingAreaOfTwoCircles = overlappingAreasOfTwoCircles
+
+
+def dOverlappingAreaOfTwoCircles(r, R, d):
+    """ Function to return the derivative of the area of overlap
+    of two circles with respect to the distance between their
+    centres, d (d can be an array).  While the circles partially
+    overlap this is minus the length of the common chord,
+    otherwise it is zero."""
+
+    d = np.asarray(d, dtype=float)
+    partial = (d < (r + R)) & (d > abs(R - r))
+    product = (-d + r + R)*(d + r - R)*(d - r + R)*(d + r + R)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        chord = np.sqrt(np.where(partial, product, 0.0))/d
+    return np.where(partial, -chord, 0.0)
+
+
+def nearestNeighbourGapsLoop(cellArray):
+    """Original element-by-element version of the gap calculation in
+    CellArray.calculateNearestNeighbours (kept for benchmarking)."""
+
+    gaps = np.zeros(cellArray.nearestNeighbourDistanceVec.shape)
+    it = np.nditer(gaps, flags=['multi_index'], op_flags=['writeonly'])
+    while not it.finished:
+        r = it.multi_index[0]
+        c = it.multi_index[1]
+        it[0] = cellArray.nearestNeighbourDistanceVec[r][c] \
+                - cellArray.radiiVec[cellArray.nearestNeighboursVec[r][c]] \
+                - cellArray.radiiVec[r]
+        it.iternext()
+    return gaps
+
+
+def benchmarkNearestNeighbours(cellArray, repeats=20):
+    """Micro-benchmark of the nearest neighbour gap calculation.
+    Prints the time per cost function evaluation taken by the
+    original loop and by CellArray.calculateNearestNeighbours."""
+
+    cellArray.calculateNearestNeighbours()
+    assert np.allclose(nearestNeighbourGapsLoop(cellArray), \
+                       cellArray.nearestNeighbourGapVec)
+
+    t0 = timeit.default_timer()
+    for i in range(repeats):
+        nearestNeighbourGapsLoop(cellArray)
+    tLoop = (timeit.default_timer() - t0)/repeats
+
+    t0 = timeit.default_timer()
+    for i in range(repeats):
+        cellArray.calculateNearestNeighbourGaps()
+    tVectorized = (timeit.default_timer() - t0)/repeats
+
+    t0 = timeit.default_timer()
+    for i in range(repeats):
+        cellArray.calculateNearestNeighbours()
+    tTotal = (timeit.default_timer() - t0)/repeats
+
+    n = (cellArray.numCells, cellArray.numNeighbours)
+    print "Nearest neighbour gaps (%d cells, %d neighbours):" % n
+    print "\tnditer loop:                   %9.3f ms" % (tLoop*1000.0)
+    print "\tcalculateNearestNeighbourGaps: %9.3f ms" % (tVectorized*1000.0)
+    print "\tcalculateNearestNeighbours:    %9.3f ms" % (tTotal*1000.0)
+
+    return tLoop, tVectorized
 
 
 def spreadPointsRandomly(width, height, num):
@@ -669,7 +1058,6 @@ class DisplayWindow:
         self.cellArray.normalize()
         self.removeDensityAreas()
         nx = self.cellArray.width / self.cellArray.gridSpacing
-        self.cellArray.createKDTree()
         self.cellArray.calculateCellDensitiesAtGridPoints()
         for (x, y) in self.cellArray.gridPoints:
             c = gr.Circle(gr.Point(x*gbl.scale, y*gbl.scale), \
@@ -1106,6 +1494,8 @@ def runOptimization(cellArray, displayWindow):
     """Run solver for set number of iterations."""
 
     gbl.loopTimes = inputInteger("Enter maximum loops", gbl.loopTimes)
+    method = inputString("Optimization method (Powell or L-BFGS-B)", \
+                         "L-BFGS-B")
 
     # Keep a running sum of the last 5 errors:
     qErrors = [9e9, 8e9, 7e9, 6e9, 5e9]
@@ -1142,7 +1532,7 @@ def runOptimization(cellArray, displayWindow):
     while 1:
 
         # Call solver sub-routine
-        e = cellArray.adjustCellPositions(gbl.maxIterations)
+        e = cellArray.adjustCellPositions(gbl.maxIterations, method)
         loopCounter += 1
 
         # Update KD Tree if it isn't being done by the cost function
@@ -0,0 +1,181 @@
+import threading
+import numpy as np
+
+
+# Gamma correction curves
+CIE = 'cie'  # CIE 1931 lightness (as used for the ciel8 table)
+LINEAR = 'linear'
+
+# Colour correction (R, G, B scale factors 0-255) equivalent to
+# FastLED's TypicalLEDStrip
+TYPICAL_LED_STRIP = (255, 176, 240)
+UNCORRECTED_COLOR = (255, 255, 255)
+
+
+def cie_lightness(v: np.ndarray) -> np.ndarray:
+    """
+    Convert perceived lightness (0 to 1) to LED intensity (0 to 1)
+    using the CIE 1931 lightness formula.
+    """
+    lightness = v * 100.0
+    return np.where(
+        lightness > 8.0,
+        ((lightness + 16.0) / 116.0) ** 3,
+        lightness / 903.3
+    )
+
+
+def make_lookup_tables(
+    gamma=CIE,
+    correction: tuple = UNCORRECTED_COLOR,
+    brightness: float = 1.0
+) -> np.ndarray:
+    """
+    Calculate the output intensity of each channel for every 8-bit
+    input value.
+
+    Args:
+        gamma: CIE, LINEAR or a gamma exponent (e.g. 2.2)
+        correction: R, G, B scale factors (0-255) to correct the
+            white balance of the LEDs
+        brightness: Global brightness (0 to 1)
+
+    Returns:
+        Float array with shape (3, 256) of output values (0 to 255)
+    """
+    v = np.arange(256) / 255.0
+    if gamma == CIE:
+        levels = cie_lightness(v)
+    elif gamma == LINEAR:
+        levels = v
+    else:
+        levels = v ** float(gamma)
+    scale = np.asarray(correction, dtype=np.float64)[:, None] * brightness
+    return np.clip(levels[None, :] * scale, 0.0, 255.0)
+
+
+class ColourPipeline:
+    """
+    Gamma, white balance and brightness correction of LED frames.
+
+    All the corrections are folded into one 256-entry lookup table
+    per channel so a frame is converted in a single indexing pass
+    on the host and the firmware can send the values to the LEDs
+    unmodified (i.e. with no colour correction or brightness scaling
+    of its own).
+
+    With temporal dithering enabled, the lookup tables keep 8
+    fractional bits and a per-LED threshold that changes every frame
+    is added before rounding down.  Values in between two 8-bit
+    levels then average out to the right intensity over successive
+    frames, which preserves dark shades that would otherwise all be
+    rounded to 0 or 1.
+
+    The settings can be changed (e.g. by an AmbientLightSampler) from
+    a different thread to the one applying the pipeline.
+    """
+
+    def __init__(
+        self,
+        gamma=CIE,
+        correction: tuple = UNCORRECTED_COLOR,
+        brightness: float = 1.0,
+        dither: bool = False,
+        seed: int = 0
+    ):
+        """
+        Initialize the colour pipeline.
+
+        Args:
+            gamma: CIE, LINEAR or a gamma exponent (e.g. 2.2)
+            correction: R, G, B scale factors (0-255), e.g.
+                TYPICAL_LED_STRIP
+            brightness: Global brightness (0 to 1)
+            dither: Whether to apply temporal dithering
+            seed: Seed for the random dither thresholds
+        """
+        self.gamma = gamma
+        self.correction = tuple(correction)
+        self.brightness = brightness
+        self.dither = dither
+        self.rng = np.random.default_rng(seed)
+        self.thresholds = None
+        self.frame_count = 0
+        self.lock = threading.RLock()
+        self.update_tables()
+
+    def update_tables(self):
+        """Recalculate the lookup tables after a change to the
+        settings."""
+        with self.lock:
+            levels = make_lookup_tables(
+                self.gamma, self.correction, self.brightness
+            )
+            # Tables are flattened so channel c of value v is at
+            # c * 256 + v
+            lut = np.rint(levels).astype(np.uint8).ravel()
+            lut16 = np.floor(levels * 256.0).astype(np.uint16).ravel()
+            np.minimum(lut16, 255 * 256, out=lut16)
+            self.lut, self.lut16 = lut, lut16
+
+    def set_brightness(self, brightness: float):
+        """
+        Change the global brightness.
+
+        Args:
+            brightness: Global brightness (0 to 1)
+        """
+        with self.lock:
+            self.brightness = min(max(brightness, 0.0), 1.0)
+            self.update_tables()
+
+    def apply(self, frame: np.ndarray, out: np.ndarray = None) -> np.ndarray:
+        """
+        Convert a frame of RGB values to LED output values.
+
+        Args:
+            frame: uint8 array with shape (num_leds, 3)
+            out: Optional uint8 array for the result (may be frame)
+
+        Returns:
+            uint8 array with shape (num_leds, 3)
+        """
+        with self.lock:
+            lut, lut16 = self.lut, self.lut16
+
+        # Index of each value in the flattened tables
+        index = frame + np.array([0, 256, 512], dtype=np.uint16)
+        if out is None:
+            out = np.empty(frame.shape, dtype=np.uint8)
+        if not self.dither:
+            return np.take(lut, index, out=out)
+
+        if self.thresholds is None or self.thresholds.shape != frame.shape:
+            self.thresholds = self.rng.integers(
+                0, 256, size=frame.shape, dtype=np.uint16
+            )
+        # Adding an odd multiple of the frame number cycles each
+        # LED's threshold through all 256 values
+        offset = (self.frame_count * 97) & 0xff
+        self.frame_count += 1
+        values = np.take(lut16, index)
+        values += (self.thresholds + offset) & 0xff
+        values >>= 8
+        out[:] = values
+        return out
+
+
+# Example usage
+if __name__ == "__main__":
+    import time
+
+    pipeline = ColourPipeline(correction=TYPICAL_LED_STRIP, brightness=0.2)
+    frame = np.random.randint(0, 256, size=(1593, 3), dtype=np.uint8)
+    for dither in (False, True):
+        pipeline.dither = dither
+        n_repeats = 1000
+        t0 = time.perf_counter()
+        for _ in range(n_repeats):
+            pipeline.apply(frame)
+        t = (time.perf_counter() - t0) / n_repeats
+        print(f"dither={dither}: {t * 1e6:.1f} us per frame")
@@ -1,8 +1,25 @@
 import serial
 import time
+import threading
 import numpy as np
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from serial import SerialException
-from serial_utils import open_serial_connections, establish_communication
+from serial_utils import (
+    open_serial_connections, establish_communication, read_serial,
+    write_serial
+)
+from frame_writer import FrameWriter, AckWindow, BLOCK, put_all
+from frame_encoding import (
+    RawFrameEncoder, DeltaFrameEncoder, CompressedFrameEncoder,
+    ReducedDepthFrameEncoder, FrameSyncEncoder, RAW, DELTA, COMPRESSED,
+    RGB565, LEVELS, FRAME_SYNC
+)
+from colour1593 import ColourPipeline
+from power1593 import PowerLimiter
+from frame_scheduler import FrameScheduler, SKIP_TO_LATEST
+from ambient1593 import (
+    AmbientLightSampler, BRIGHTNESS_COMMAND, PHOTORES_DEVICE_ID
+)
 
 
 DEFAULT_BAUD_RATE = 921600
@@ -11,6 +28,7 @@ OTHER_DEVICE_IDS = [49, 50]
 NOT_CONNECTED = 'not connected'
 CONNECTED = 'connected'
 COMMUNICATING = 'communicating'
+FAILED = 'failed'  # Connection attempt failed (see connection_errors)
 DEVICE_STATUS = {
     0: NOT_CONNECTED,
     1: CONNECTED,
@@ -24,6 +42,90 @@ SERIAL_PORTS = {
     50: '/dev/cu.usbmodem6862001'
 }
 
+# Total number of LEDs in the display
+NUM_LEDS = 1593
+
+# Number of LEDs on each of the 8 strips connected to each Teensy
+# (Teensy1 drives display LEDs 0 to 797, Teensy2 drives 798 to 1592).
+# These reproduce the lookupTable arrays in serial_read_1593.ino,
+# which is what the firmware uses to translate LED numbers into
+# OctoWS2811 pixel numbers.  Note that the ledsPerStrip arrays in
+# the same file do not agree with the lookup tables.
+LEDS_PER_STRIP = {
+    49: (100, 100, 98, 100, 100, 100, 100, 100),
+    50: (99, 99, 99, 100, 100, 100, 100, 98)
+}
+MAX_LEDS_PER_STRIP = 100
+
+# Device that sends the frame sync pulse to the other board when
+# using FRAME_SYNC frames (videodisplay1593.ino)
+FRAME_SYNC_MASTER = 49
+
+# Time from the start of each frame until the frame sync pulse is
+# FRAME_SYNC_MARGIN times the longest measured transfer time of a
+# frame plus FRAME_SYNC_OVERHEAD (seconds).  Until the transfer
+# times have been measured FRAME_SYNC_DEFAULT is used.  The slave
+# boards only wait 30 ms for the pulse.
+FRAME_SYNC_MARGIN = 1.25
+FRAME_SYNC_OVERHEAD = 0.0005
+FRAME_SYNC_DEFAULT = 0.01
+FRAME_SYNC_MAX = 0.025
+
+
+def make_segment_indices(leds_per_strip=LEDS_PER_STRIP):
+    """
+    Calculate which display LEDs are sent to each Teensy device.
+
+    Devices are assigned consecutive blocks of display LED numbers
+    in order of device id.
+
+    Args:
+        leds_per_strip: Dictionary of the number of LEDs on each
+            strip of each device
+
+    Returns:
+        Dictionary of integer index arrays (one per device) that
+        gather each device's segment from a full (NUM_LEDS, 3) frame
+    """
+    segment_indices = {}
+    first_led = 0
+    for device_id in sorted(leds_per_strip):
+        num_leds = sum(leds_per_strip[device_id])
+        segment_indices[device_id] = np.arange(
+            first_led, first_led + num_leds, dtype=np.intp
+        )
+        first_led += num_leds
+    return segment_indices
+
+
+def make_pixel_indices(
+    leds_per_strip=LEDS_PER_STRIP,
+    max_leds_per_strip=MAX_LEDS_PER_STRIP
+):
+    """
+    Calculate the OctoWS2811 pixel number of every LED on each device.
+
+    This is the equivalent of the lookupTable arrays in
+    serial_read_1593.ino.
+
+    Args:
+        leds_per_strip: Dictionary of the number of LEDs on each
+            strip of each device
+        max_leds_per_strip: Number of pixels allocated to each strip
+            by OctoWS2811
+
+    Returns:
+        Dictionary of integer arrays (one per device) of Teensy pixel
+        numbers in the same order as the device segments
+    """
+    pixel_indices = {}
+    for device_id in sorted(leds_per_strip):
+        pixel_indices[device_id] = np.concatenate([
+            np.arange(n, dtype=np.intp) + strip * max_leds_per_strip
+            for strip, n in enumerate(leds_per_strip[device_id])
+        ])
+    return pixel_indices
+
 
 class Display1593:
     """
@@ -37,6 +139,10 @@ class Display1593:
         self,
         ports: list[str] = SERIAL_PORTS,
         baud_rate: int = DEFAULT_BAUD_RATE,
+        leds_per_strip: dict = LEDS_PER_STRIP,
+        frame_format: str = RAW,
+        colour_pipeline: ColourPipeline = None,
+        power_limiter: PowerLimiter = None,
     ):
         """
         Initialize the LED display controller.
@@ -45,129 +151,693 @@ class Display1593:
             port: Serial port name (e.g., 'COM3' on Windows,
                 '/dev/ttyUSB0' on Linux)
             baud_rate: Serial baud rate (should match Arduino code)
+            leds_per_strip: Number of LEDs on each strip of each
+                device (see LEDS_PER_STRIP)
+            frame_format: How frames are encoded, either RAW (header
+                marker and all RGB values), DELTA (only the LEDs
+                that changed, using the serial_read_1593 'N' command,
+                when that is shorter than a full 'A' update) or
+                COMPRESSED (as DELTA but also considering run-length
+                'L' and palette 'P' updates).  RGB565 and LEVELS send
+                16 bits per LED instead of 24 (see
+                frame_encoding.ReducedDepthFrameEncoder).  FRAME_SYNC
+                sends OctoWS2811 drawingMemory to videodisplay1593.ino
+                so that all boards update the LEDs at the same instant
+                (see frame_encoding.FrameSyncEncoder)
+            colour_pipeline: Optional ColourPipeline used to apply
+                gamma, colour correction and brightness to the frames
+                passed to send_frame (frames rendered directly into
+                segment_buffers are sent unchanged)
+            power_limiter: Optional PowerLimiter used to scale down
+                frames passed to send_frame that would draw more
+                current than the power supplies can provide (applied
+                after colour_pipeline)
         """
         self.ports = ports
         self.baud_rate = baud_rate
         self.serial_conns = None
         self.device_status = {device_id: NOT_CONNECTED for device_id in ports}
+        self.connection_errors = {}
         self.header_marker = 0xAB  # Must match Arduino code
-
-    def connect(self) -> bool:
-        """Connect to the Teensy controllers."""
-        self.serial_conns = open_serial_connections(
-            self.ports, baud_rate=self.baud_rate
-        )
-        for device_id, serial_conn in self.serial_conns.items():
-            self.device_status[device_id] = CONNECTED
-        failed_connections = (
-            set(self.serial_conns.keys()) - set(self.ports.keys())
+        self.seq_header_marker = 0xAC  # Frame with sequence number
+        self.num_leds = sum(sum(n) for n in leds_per_strip.values())
+        self.segment_indices = make_segment_indices(leds_per_strip)
+        self.pixel_indices = make_pixel_indices(leds_per_strip)
+        self.frame_format = frame_format
+        self.colour_pipeline = colour_pipeline
+        self.power_limiter = power_limiter
+        if frame_format == RAW:
+            self.encoders = {
+                device_id: RawFrameEncoder(
+                    len(segment_index),
+                    self.header_marker,
+                    self.seq_header_marker
+                )
+                for device_id, segment_index in self.segment_indices.items()
+            }
+        elif frame_format == DELTA:
+            self.encoders = {
+                device_id: DeltaFrameEncoder(pixel_index)
+                for device_id, pixel_index in self.pixel_indices.items()
+            }
+        elif frame_format == COMPRESSED:
+            self.encoders = {
+                device_id: CompressedFrameEncoder(pixel_index)
+                for device_id, pixel_index in self.pixel_indices.items()
+            }
+        elif frame_format in (RGB565, LEVELS):
+            self.encoders = {
+                device_id: ReducedDepthFrameEncoder(
+                    len(segment_index), frame_format
+                )
+                for device_id, segment_index in self.segment_indices.items()
+            }
+        elif frame_format == FRAME_SYNC:
+            if FRAME_SYNC_MASTER not in self.pixel_indices:
+                raise ValueError(
+                    f"no frame sync master device {FRAME_SYNC_MASTER}"
+                )
+            self.encoders = {
+                device_id: FrameSyncEncoder(
+                    pixel_index, master=(device_id == FRAME_SYNC_MASTER)
+                )
+                for device_id, pixel_index in self.pixel_indices.items()
+            }
+        else:
+            raise ValueError(f"invalid frame_format: {frame_format!r}")
+
+        # Smoothed time taken to send a frame to each device
+        # (used to time the FRAME_SYNC pulse)
+        self.transfer_times = {device_id: None for device_id in ports}
+
+        # Preallocated frame buffer of each device.  Frames can be
+        # rendered directly into these and sent with
+        # send_frame(None).  With RAW frames they are views of the
+        # encoders' send buffers so nothing is copied at all, except
+        # while the writer threads are running (see start_writers).
+        self.segment_buffers = {
+            device_id: (
+                encoder.frame if frame_format == RAW else
+                np.zeros((len(self.segment_indices[device_id]), 3),
+                         dtype=np.uint8)
+            )
+            for device_id, encoder in self.encoders.items()
+        }
+        self.executor = None
+        self.writers = None
+        self.ack_windows = None
+        self.ambient_light = None
+        self.ambient_light_device = None
+
+    @property
+    def connected(self) -> bool:
+        """True if communication is established with all devices."""
+        return all(
+            status == COMMUNICATING for status in self.device_status.values()
         )
-        if len(failed_connections) > 0:
+
+    def connect(self, timeout: float = 10.0) -> bool:
+        """
+        Connect to the Teensy controllers.
+
+        The serial ports are opened and the connection handshakes
+        are done for all devices concurrently.  The progress of each
+        device is shown in self.device_status and this returns as
+        soon as all devices are communicating.
+
+        If any device fails to connect, all the serial ports are
+        closed again, the devices that failed are given the status
+        FAILED (with the reason in self.connection_errors) and a
+        SerialException is raised.
+
+        Args:
+            timeout: Overall time limit for connecting to all
+                devices (seconds)
+        """
+        # Close any previous connections (and their worker threads)
+        if self.executor is not None:
+            self.disconnect()
+
+        deadline = time.monotonic() + timeout
+        self.serial_conns = {}
+        self.connection_errors = {}
+
+        # One worker thread per device.  These are used for the
+        # handshakes and then so that the frame segments are written
+        # to all devices concurrently
+        self.executor = ThreadPoolExecutor(max_workers=len(self.ports))
+        futures = {
+            self.executor.submit(self.connect_device, device_id, deadline):
+                device_id
+            for device_id in self.ports
+        }
+        errors = {}
+        try:
+            for future in as_completed(futures, timeout=timeout):
+                try:
+                    msg = future.result()
+                except Exception as e:
+                    msg = f"error connecting to device: {e}"
+                if msg:
+                    errors[futures[future]] = msg
+        except TimeoutError:
+            for future, device_id in futures.items():
+                if not future.done():
+                    errors[device_id] = "timed out connecting to device"
+        if len(errors) > 0:
+            # Closing the ports makes any handshakes that timed out
+            # give up.  Once they have finished, close any ports they
+            # opened in the meantime
+            for serial_conn in list(self.serial_conns.values()):
+                serial_conn.close()
+            self.executor.shutdown(wait=True)
+            self.executor = None
+            for device_id, serial_conn in self.serial_conns.items():
+                serial_conn.close()
+                self.device_status[device_id] = NOT_CONNECTED
+            for device_id in errors:
+                self.device_status[device_id] = FAILED
+            self.connection_errors = errors
             raise SerialException(
-                f"Failed to connect to devices: {failed_connections}"
+                "Failed to connect to devices: " + ", ".join(
+                    f"device {device_id}: {msg}"
+                    for device_id, msg in errors.items()
+                )
             )
-        for device_id, serial_conn in self.serial_conns.items():
-            status, device_id_reported, msg = \
-                establish_communication(serial_conn)
-            if status > 0:
-                raise SerialException(f"device {device_id}: {msg}")
+        return True
+
+    def connect_device(self, device_id: int, deadline: float) -> str:
+        """
+        Open the serial port of one device and establish
+        communication with it.
+
+        Args:
+            device_id: Id of the device to connect to
+            deadline: Time (time.monotonic) to give up by
+
+        Returns:
+            Empty string if successful, otherwise an error message
+        """
+        serial_conns = open_serial_connections(
+            {device_id: self.ports[device_id]}, baud_rate=self.baud_rate
+        )
+        if device_id not in serial_conns:
+            return "failed to open serial port"
+        serial_conn = serial_conns[device_id]
+        self.serial_conns[device_id] = serial_conn
+        self.device_status[device_id] = CONNECTED
+        if self.frame_format == FRAME_SYNC:
+            msg = self.check_video_parameters(device_id, deadline)
+            if msg:
+                return msg
             self.device_status[device_id] = COMMUNICATING
-            assert device_id_reported == device_id
-        # TODO: Temp fix while testing
-        self.ser = self.serial_conns[1]
+            return ""
+        status, device_id_reported, msg = establish_communication(
+            serial_conn, timeout=max(0.0, deadline - time.monotonic())
+        )
+        if status > 0:
+            return msg
+        if device_id_reported != device_id:
+            return f"device reported id {device_id_reported}"
+        self.device_status[device_id] = COMMUNICATING
+        return ""
+
+    def check_video_parameters(self, device_id: int, deadline: float) -> str:
+        """
+        Check that a device running videodisplay1593.ino is set up
+        for the number of LEDs per strip used by this display.
+
+        videodisplay1593.ino has no connection handshake, so this
+        sends the '?' query instead.  The first two values of the
+        reply are LED_WIDTH and LED_HEIGHT.
+
+        Args:
+            device_id: Id of the device to check
+            deadline: Time (time.monotonic) to give up by
+
+        Returns:
+            Empty string if successful, otherwise an error message
+        """
+        serial_conn = self.serial_conns[device_id]
+        serial_conn.reset_input_buffer()
+        write_serial(serial_conn, b'?')
+        reply = b''
+        while not reply.endswith(b'\n'):
+            b = read_serial(
+                serial_conn, 1, timeout=max(0.0, deadline - time.monotonic())
+            )
+            if not b:
+                return "gave up waiting for response to '?' query"
+            reply += b
+        try:
+            width, height = [int(x) for x in reply.split(b',')[:2]]
+        except ValueError:
+            return f"invalid response to '?' query: {reply!r}"
+        max_leds_per_strip = self.encoders[device_id].packer.max_leds_per_strip
+        if width * height // 8 != max_leds_per_strip:
+            return (f"device has {width * height // 8} LEDs per strip, "
+                    f"expected {max_leds_per_strip}")
+        return ""
+
+    def frame_sync_delay(self) -> float:
+        """
+        Time from the start of a FRAME_SYNC frame until the master
+        sends the frame sync pulse, which must be long enough for
+        every board to receive its frame (seconds).
+        """
+        transfer_times = [t for t in self.transfer_times.values()
+                          if t is not None]
+        if len(transfer_times) < len(self.transfer_times):
+            return FRAME_SYNC_DEFAULT
+        return min(
+            max(transfer_times) * FRAME_SYNC_MARGIN + FRAME_SYNC_OVERHEAD,
+            FRAME_SYNC_MAX
+        )
 
     def disconnect(self):
         """Disconnect from the Teensy controllers."""
+        self.stop_writers()
+        self.stop_ack_windows()
+        if self.executor is not None:
+            self.executor.shutdown(wait=True)
+            self.executor = None
         for device_id, serial_conn in self.serial_conns.items():
             if serial_conn.is_open:
                 serial_conn.close()
-                device_status[device_id] = NOT_CONNECTED
+                self.device_status[device_id] = NOT_CONNECTED
 
-    def send_frame(self, frame: np.ndarray, wait_for_ack: bool = True) -> bool:
+    def start_writers(
+        self,
+        queue_size: int = 2,
+        full_policy: str = BLOCK,
+        wait_for_ack: bool = True
+    ):
         """
-        Send a single frame to the LED matrix.
+        Start one background writer thread per device.
+
+        While the writers are running, send_frame only queues each
+        frame and returns immediately, so the next frame can be
+        rendered while the previous one is being transmitted.
+
+        The writer threads encode queued frames into the encoders'
+        send buffers, so with RAW frames self.segment_buffers is
+        replaced by separate buffers (with the same contents) until
+        stop_writers is called.  Get self.segment_buffers again after
+        starting or stopping the writers rather than keeping a
+        reference to the old buffers.
 
         Args:
-            frame: Numpy array with shape (length, 3) containing RGB
-                values (0-255)
+            queue_size: Number of frame buffers queued per device
+            full_policy: What to do when a queue is full (BLOCK,
+                DROP_OLDEST or DROP_NEWEST from frame_writer).  A
+                frame is dropped on all devices or none (see put_all)
+            wait_for_ack: Whether the writers wait for acknowledgment
+                of each frame from the Arduino
+        """
+        if not self.connected:
+            raise SerialException("Not connected to devices")
+        self.stop_writers()
+        condition = threading.Condition()
+        writers = {}
+        for device_id, segment_index in self.segment_indices.items():
+            def send(segment, device_id=device_id):
+                return self.send_segment(device_id, segment, wait_for_ack)
+            writers[device_id] = FrameWriter(
+                send,
+                (len(segment_index), 3),
+                queue_size=queue_size,
+                full_policy=full_policy,
+                name=f"FrameWriter-{device_id}",
+                condition=condition
+            )
+        for writer in writers.values():
+            writer.start()
+        self.writers = writers
+        if self.frame_format == RAW:
+            self.segment_buffers = {
+                device_id: segment.copy()
+                for device_id, segment in self.segment_buffers.items()
+            }
+
+    def stop_writers(self, timeout: float = None):
+        """Stop the writer threads after sending any queued frames."""
+        if self.writers is None:
+            return
+        for writer in self.writers.values():
+            writer.stop(timeout=timeout)
+        self.writers = None
+        if self.frame_format == RAW:
+            # Render straight into the send buffers again
+            for device_id, encoder in self.encoders.items():
+                encoder.frame[:] = self.segment_buffers[device_id]
+            self.segment_buffers = {
+                device_id: encoder.frame
+                for device_id, encoder in self.encoders.items()
+            }
+
+    def start_ack_windows(
+        self,
+        window_size: int = 4,
+        ack_timeout: float = 1.0
+    ):
+        """
+        Switch to pipelined acknowledgments.
+
+        Frames are sent with a sequence number and up to window_size
+        frames per device may be awaiting acknowledgment at once.
+        Acknowledgments are consumed by a background reader thread
+        for each device.  Requires the sequence number support in
+        arduino-fastled-controller.ino.
+
+        Args:
+            window_size: Maximum number of unacknowledged frames
+                per device
+            ack_timeout: Time after which an unacknowledged frame is
+                considered lost (seconds)
+        """
+        if not self.connected:
+            raise SerialException("Not connected to devices")
+        if self.frame_format != RAW:
+            raise ValueError(
+                f"{self.frame_format} frames do not support sequence numbers"
+            )
+        self.stop_ack_windows()
+        ack_windows = {
+            device_id: AckWindow(
+                serial_conn,
+                window_size=window_size,
+                ack_timeout=ack_timeout
+            )
+            for device_id, serial_conn in self.serial_conns.items()
+        }
+        for ack_window in ack_windows.values():
+            ack_window.start()
+        self.ack_windows = ack_windows
+
+    def stop_ack_windows(self):
+        """Wait for outstanding acknowledgments and switch back to
+        stop-and-wait acknowledgments."""
+        if self.ack_windows is None:
+            return
+        for ack_window in self.ack_windows.values():
+            ack_window.stop()
+        self.ack_windows = None
+
+    def start_ambient_light(
+        self,
+        sampler: AmbientLightSampler,
+        device_id: int = PHOTORES_DEVICE_ID
+    ):
+        """
+        Start adjusting the brightness to the ambient light level.
+
+        The photoresistor is read by appending a 'B' command to a
+        frame sent to the device whenever a reading is due, and the
+        reply is read straight after the frame acknowledgment.  This
+        uses the same thread and serial port as the frames, so no
+        extra synchronization is needed and the writer is only held
+        up for the two bytes of the reply.  Readings are only taken
+        while frames are being sent with wait_for_ack=True.
+
+        Args:
+            sampler: AmbientLightSampler that converts the readings
+                to a brightness (must have been created with this
+                display's colour_pipeline)
+            device_id: Id of the device with the photoresistor
+        """
+        if self.colour_pipeline is None or \
+                sampler.colour_pipeline is not self.colour_pipeline:
+            raise ValueError(
+                "sampler must use the display's colour_pipeline"
+            )
+        if self.frame_format in (RAW, FRAME_SYNC):
+            raise ValueError(
+                f"{self.frame_format} frames are for firmware without the "
+                "'B' command"
+            )
+        if device_id not in self.ports:
+            raise ValueError(f"invalid device_id: {device_id}")
+        self.ambient_light_device = device_id
+        self.ambient_light = sampler
+
+    def stop_ambient_light(self):
+        """Stop reading the ambient light level."""
+        self.ambient_light = None
+        self.ambient_light_device = None
+
+    def send_frame(
+        self,
+        frame: np.ndarray = None,
+        wait_for_ack: bool = True
+    ) -> bool:
+        """
+        Send a single frame to the LED display.
+
+        The frame is split into one segment per Teensy device and
+        the segments are sent to all devices concurrently.  If the
+        writer threads have been started (see start_writers) the
+        segments are queued and this returns without waiting.
+
+        Args:
+            frame: Numpy array with shape (num_leds, 3) containing RGB
+                values (0-255).  If None, the frame already rendered
+                into self.segment_buffers is sent.  With RAW frames
+                these are the encoders' send buffers, except while
+                the writer threads are running (see start_writers).
             wait_for_ack: Whether to wait for acknowledgment from Arduino
+                (ignored when the writer threads are running)
 
         Returns:
-            True if frame was sent successfully, False otherwise
+            True if frame was sent (or queued) successfully, False
+            otherwise
         """
-        if not self.connected or not self.ser or not self.ser.is_open:
+        if not self.connected or self.executor is None:
             print("Not connected to Arduino")
             return False
 
-        # Ensure frame has the right dimensions
-        if frame.shape != (self.matrix_size[0], 3):
-            print(f"Frame has wrong dimensions: {frame.shape}, expected "\
-                  f"{(self.matrix_size[0], 3)}")
+        if frame is not None:
+
+            # Only check and convert frames that are not already
+            # the right type
+            if frame.dtype != np.uint8 or frame.shape != (self.num_leds, 3):
+                if frame.shape != (self.num_leds, 3):
+                    print(f"Frame has wrong dimensions: {frame.shape}, "\
+                          f"expected {(self.num_leds, 3)}")
+                    return False
+                frame = frame.astype(np.uint8)
+
+            if self.colour_pipeline is not None:
+                frame = self.colour_pipeline.apply(frame)
+            if self.power_limiter is not None:
+                frame = self.power_limiter.limit(frame)
+
+            if self.writers is not None:
+                return put_all(
+                    [self.writers[device_id]
+                     for device_id in self.segment_indices],
+                    [frame] * len(self.segment_indices),
+                    list(self.segment_indices.values())
+                )
+
+            # Gather each device's segment straight into its buffer
+            for device_id, segment_index in self.segment_indices.items():
+                np.take(frame, segment_index, axis=0,
+                        out=self.segment_buffers[device_id], mode='clip')
+
+        elif self.writers is not None:
+            return put_all(
+                [self.writers[device_id]
+                 for device_id in self.segment_buffers],
+                list(self.segment_buffers.values())
+            )
+
+        futures = [
+            self.executor.submit(
+                self.send_segment, device_id, segment, wait_for_ack
+            )
+            for device_id, segment in self.segment_buffers.items()
+        ]
+        return all([future.result() for future in futures])
+
+    def send_segment(
+        self,
+        device_id: int,
+        segment: np.ndarray,
+        wait_for_ack: bool = True
+    ) -> bool:
+        """
+        Send one device's segment of a frame.
+
+        Args:
+            device_id: Id of the device to send the segment to
+            segment: Numpy array with shape (n, 3) containing the RGB
+                values (0-255) of the LEDs connected to the device
+            wait_for_ack: Whether to wait for acknowledgment from Arduino
+                (ignored if the acknowledgment windows are started, and
+                for FRAME_SYNC frames which are not acknowledged)
+
+        Returns:
+            True if segment was sent successfully, False otherwise
+        """
+        ser = self.serial_conns[device_id]
+        if not ser.is_open:
+            print(f"Device {device_id} not connected")
             return False
 
-        try:
-            # Send header marker to signal start of new frame
-            self.ser.write(bytes([self.header_marker]))
+        if self.frame_format == FRAME_SYNC:
+            return self.send_frame_sync_segment(device_id, segment)
 
-            # Flatten frame data row by row and send as bytes
-            flattened = frame.reshape(-1, 3).astype(np.uint8)
+        encoder = self.encoders[device_id]
+        if self.ack_windows is not None:
+            ack_window = self.ack_windows[device_id]
+            seq = ack_window.acquire(timeout=ack_window.ack_timeout)
+            if seq is None:
+                print(f"Device {device_id}: Timed out waiting for frame "
+                      "acknowledgment")
+                return False
+            try:
+                write_serial(ser, encoder.encode(segment, seq))
+                return True
+            except Exception as e:
+                print(f"Device {device_id}: Error sending frame: {e}")
+                return False
+
+        ambient_light = self.ambient_light
+        sample_light = (
+            wait_for_ack and ambient_light is not None
+            and device_id == self.ambient_light_device
+            and ambient_light.due()
+        )
 
-            # Send all pixel data
-            self.ser.write(flattened.tobytes())
+        try:
+            # Send the encoded frame (starting with a header or command
+            # code to signal the start of a new frame) in one write
+            write_serial(ser, encoder.encode(segment))
+            if sample_light:
+                write_serial(ser, BRIGHTNESS_COMMAND)
 
             # Wait for acknowledgment if required
             if wait_for_ack:
-                start_time = time.time()
-                while time.time() - start_time < 1.0:
-                    if self.ser.in_waiting > 0:
-                        ack_byte = self.ser.read(1)
-                        if ack_byte == b'A':
-                            return True
-                    time.sleep(0.001)
-                print("Timed out waiting for frame acknowledgment")
+                deadline = time.monotonic() + 1.0
+                while True:
+                    ack_byte = read_serial(
+                        ser, 1, timeout=deadline - time.monotonic()
+                    )
+                    if ack_byte == b'A':
+                        encoder.commit()
+                        if sample_light:
+                            # Photoresistor reading follows the ACK.
+                            # If it is incomplete, discard the rest so
+                            # it isn't mistaken for the next ACK
+                            reading = read_serial(ser, 2, timeout=0.1)
+                            if len(reading) < 2:
+                                ser.reset_input_buffer()
+                            ambient_light.update(
+                                int.from_bytes(reading, 'big')
+                                if len(reading) == 2 else None
+                            )
+                        return True
+                    if not ack_byte:
+                        break
+                encoder.reset()
+                print(f"Device {device_id}: Timed out waiting for frame "
+                      "acknowledgment")
                 return False
 
+            # Without an acknowledgment there is no way of knowing
+            # whether the device applied the frame, so delta frames
+            # can't be based on it.  The next frame is sent in full
+            encoder.reset()
             return True
 
         except Exception as e:
-            print(f"Error sending frame: {e}")
+            encoder.reset()
+            print(f"Device {device_id}: Error sending frame: {e}")
             return False
 
-    def play_video(self, video_data: np.ndarray, fps: int = 24, loop: bool = False) -> None:
+    def send_frame_sync_segment(
+        self,
+        device_id: int,
+        segment: np.ndarray
+    ) -> bool:
+        """
+        Send one device's segment of a FRAME_SYNC frame.
+
+        These frames are not acknowledged.  Instead the write waits
+        until the data has been transmitted, which keeps the sender
+        from running ahead of the display and measures the transfer
+        time used to time the frame sync pulse.
+
+        Args:
+            device_id: Id of the device to send the segment to
+            segment: Numpy array with shape (n, 3) containing the RGB
+                values (0-255) of the LEDs connected to the device
+
+        Returns:
+            True if segment was sent successfully, False otherwise
+        """
+        ser = self.serial_conns[device_id]
+        encoder = self.encoders[device_id]
+        if encoder.master:
+            encoder.usec_until_frame_sync = self.frame_sync_delay() * 1e6
+        try:
+            data = encoder.encode(segment)
+            t0 = time.perf_counter()
+            write_serial(ser, data)
+            ser.flush()
+            transfer_time = time.perf_counter() - t0
+        except Exception as e:
+            print(f"Device {device_id}: Error sending frame: {e}")
+            return False
+
+        # Exponential moving average of the transfer time
+        previous = self.transfer_times[device_id]
+        self.transfer_times[device_id] = transfer_time if previous is None \
+            else previous + 0.1 * (transfer_time - previous)
+        return True
+
+    def play_video(
+        self,
+        video_data: np.ndarray,
+        fps: int = 24,
+        loop: bool = False,
+        policy: str = SKIP_TO_LATEST,
+        spin_time: float = 0.0
+    ) -> dict:
         """
         Play a video on the LED matrix.
 
+        Frames are sent at fixed deadlines from the start of playback
+        (see FrameScheduler) so timing errors do not accumulate.
+
         Args:
-            video_data: Numpy array with shape (frames, height, width, 3)
+            video_data: Numpy array with shape (frames, num_leds, 3)
             fps: Frames per second to play at
             loop: Whether to loop the video
+            policy: What to do when playback falls behind (DROP,
+                SKIP_TO_LATEST or SLOW_DOWN from frame_scheduler)
+            spin_time: Time before each frame to busy-wait rather
+                than sleep for more precise timing (seconds)
+
+        Returns:
+            Playback statistics (see FrameScheduler.stats), all zero
+            if not connected
         """
+        if video_data.shape[0] == 0:
+            raise ValueError("video_data has no frames")
+        scheduler = FrameScheduler(fps, policy=policy, spin_time=spin_time)
+
         if not self.connected:
             print("Not connected to Arduino")
-            return
-
-        frame_time = 1.0 / fps
+            return scheduler.stats()
 
         try:
-            playing = True
-            while playing:
-                for frame_idx in range(video_data.shape[0]):
-                    start_time = time.time()
-
-                    # Send the frame
-                    success = self.send_frame(video_data[frame_idx])
-                    if not success:
-                        print(f"Failed to send frame {frame_idx}")
-                        playing = False
-                        break
+            for frame_idx in scheduler.frames(video_data.shape[0], loop):
 
-                    # Calculate sleep time to maintain frame rate
-                    elapsed = time.time() - start_time
-                    sleep_time = max(0, frame_time - elapsed)
-                    if sleep_time > 0:
-                        time.sleep(sleep_time)
-
-                if not loop:
+                # Send the frame
+                success = self.send_frame(video_data[frame_idx])
+                if not success:
+                    print(f"Failed to send frame {frame_idx}")
                     break
 
         except KeyboardInterrupt:
@@ -176,17 +846,19 @@ class Display1593:
         except Exception as e:
             print(f"Error during video playback: {e}")
 
+        return scheduler.stats()
+
 
 # Example usage
 if __name__ == "__main__":
 
     # Create test patterns
     def create_test_pattern(pattern_type="rainbow"):
-        matrix = np.zeros((100, 3), dtype=np.uint8)
+        matrix = np.zeros((NUM_LEDS, 3), dtype=np.uint8)
 
         if pattern_type == "rainbow":
             # Create a rainbow gradient
-            for i in range(100):
+            for i in range(NUM_LEDS):
                 hue = i % 255
                 # Simple HSV to RGB conversion
                 if hue < 85:
@@ -207,7 +879,7 @@ if __name__ == "__main__":
 
     # Create an animated test video (10 frames of shifting rainbow)
     def create_test_video(frames=100):
-        video = np.zeros((frames, 100, 3), dtype=np.uint8)
+        video = np.zeros((frames, NUM_LEDS, 3), dtype=np.uint8)
         for i in range(frames):
             pattern = create_test_pattern("snake")
             # Shift the pattern for each frame
@@ -216,8 +888,8 @@ if __name__ == "__main__":
 
     # Connect and send test pattern
     try:
-        # Replace with your Arduino's serial port
-        controller = LEDMatrixController(port='/dev/cu.usbmodem6862001')
+        # Replace with your Teensy serial ports (see SERIAL_PORTS)
+        controller = Display1593()
 
         if controller.connect():
             # Create and send a test video
@@ -225,7 +897,10 @@ if __name__ == "__main__":
             test_video = create_test_video(frames=100)
 
             print("Playing test pattern...")
-            controller.play_video(test_video, fps=24, loop=True)
+            stats = controller.play_video(test_video, fps=24, loop=True)
+            print(f"Played {stats['frames_shown']} frames at "
+                  f"{stats['fps']:.2f} fps (jitter {stats['jitter_ms']:.2f} "
+                  f"ms, {stats['frames_dropped']} dropped)")
 
     except KeyboardInterrupt:
         print("Program stopped by user")
@@ -0,0 +1,258 @@
+import numpy as np
+from geometry1593 import LEDGeometry, load_geometry
+
+
+# Hexagonal Game of Life rules (number of live neighbours out of 6)
+LIFE_BIRTH = (2,)
+LIFE_SURVIVE = (3, 4)
+
+
+class NeighbourEffects:
+    """
+    Vectorized effects over the nearest-neighbour graph of the LEDs.
+
+    Each method does one time step for all LEDs at once by gathering
+    the state of every LED's neighbours from the nearestNeighbours
+    table in arraydata.h (a (num_leds, k) index array) and combining
+    them with inverse-distance weights.
+
+    Note that the neighbour table is not symmetric: LED j may be one
+    of LED i's nearest neighbours but not the other way round.  All
+    the operations here 'pull' values from each LED's own neighbours.
+
+    The neighbour table was calculated for a periodic (tiled) layout,
+    so LEDs near the edges have neighbours on the opposite edge of the
+    display.  These wrap-around neighbours are left out unless wrap
+    is True.
+
+    State arrays have shape (num_leds,) or (num_leds, channels).
+    """
+
+    def __init__(
+        self,
+        geometry: LEDGeometry = None,
+        num_neighbours: int = None,
+        wrap: bool = False
+    ):
+        """
+        Initialize the effects engine.
+
+        Args:
+            geometry: LED layout (defaults to load_geometry())
+            num_neighbours: Number of nearest neighbours of each LED
+                to use (defaults to all of them)
+            wrap: Whether effects wrap around from one edge of the
+                display to the opposite edge
+        """
+        if geometry is None:
+            geometry = load_geometry()
+        k = num_neighbours or geometry.max_num_neighbours
+        self.num_leds = geometry.num_leds
+        self.neighbours = np.array(
+            geometry.nearest_neighbours[:, :k]
+        )
+        distances = geometry.nearest_neighbour_distances[:, :k]
+
+        # Wrap-around neighbours are much further away across the
+        # display than their distance in the neighbour table
+        if wrap:
+            self.valid = np.ones(self.neighbours.shape, dtype=bool)
+        else:
+            centres = geometry.centres
+            direct = np.linalg.norm(
+                centres[self.neighbours] - centres[:, None, :], axis=2
+            )
+            self.valid = direct < 1.5 * distances
+
+        # Inverse-distance weights, normalized to sum to 1 for each LED
+        weights = np.where(self.valid, 1.0 / distances, 0.0)
+
+        # An LED with no valid neighbours (possible near the edges with
+        # few neighbours) is its own neighbour, so its mean is itself
+        isolated = ~self.valid.any(axis=1)
+        self.neighbours[isolated, 0] = np.nonzero(isolated)[0]
+        weights[isolated, 0] = 1.0
+        self.weights = (weights / weights.sum(axis=1, keepdims=True))\
+            .astype(np.float32)
+
+    def gather(self, state: np.ndarray) -> np.ndarray:
+        """Values of each LED's neighbours, shape (num_leds, k, ...)."""
+        return np.take(state, self.neighbours, axis=0)
+
+    def neighbour_mean(self, state: np.ndarray) -> np.ndarray:
+        """Inverse-distance weighted mean of each LED's neighbours."""
+        return np.einsum('nk,nk...->n...', self.weights, self.gather(state))
+
+    def laplacian(self, state: np.ndarray) -> np.ndarray:
+        """Graph Laplacian: weighted neighbour mean minus own value."""
+        return self.neighbour_mean(state) - state
+
+    def diffuse(
+        self,
+        state: np.ndarray,
+        rate: float = 0.5,
+        decay: float = 0.0,
+        out: np.ndarray = None
+    ) -> np.ndarray:
+        """
+        One step of heat diffusion.
+
+        Args:
+            state: Float array of LED values
+            rate: Fraction of the difference from the neighbour mean
+                that is removed each step (0 to 1)
+            decay: Fraction of the value lost each step
+            out: Optional array for the result (may be state)
+
+        Returns:
+            New state
+        """
+        new_state = state + rate * self.laplacian(state)
+        if decay:
+            new_state *= 1.0 - decay
+        if out is None:
+            return new_state
+        out[:] = new_state
+        return out
+
+    def wave_step(
+        self,
+        u: np.ndarray,
+        u_prev: np.ndarray,
+        c2: float = 0.5,
+        damping: float = 0.01
+    ) -> np.ndarray:
+        """
+        One step of the damped wave equation (e.g. for ripples).
+
+        The new displacement is written over u_prev, so the usual
+        update is
+
+            u, u_prev = effects.wave_step(u, u_prev), u
+
+        Args:
+            u: Float array of current displacements
+            u_prev: Float array of displacements at the last step
+            c2: Squared wave speed (must be less than 1 for stability)
+            damping: Fraction of the velocity lost each step
+
+        Returns:
+            u_prev, updated to the next displacements
+        """
+        velocity = (u - u_prev) * (1.0 - damping)
+        u_prev[:] = u + velocity + c2 * self.laplacian(u)
+        return u_prev
+
+    def neighbour_count(self, alive: np.ndarray) -> np.ndarray:
+        """Number of each LED's neighbours that are set."""
+        return np.count_nonzero(
+            np.logical_and(self.gather(alive), self.valid), axis=1
+        )
+
+    def life_step(
+        self,
+        alive: np.ndarray,
+        birth: tuple = LIFE_BIRTH,
+        survive: tuple = LIFE_SURVIVE
+    ) -> np.ndarray:
+        """
+        One generation of a Game of Life style cellular automaton.
+
+        Args:
+            alive: Boolean array of live cells
+            birth: Neighbour counts at which a dead cell comes alive
+            survive: Neighbour counts at which a live cell survives
+
+        Returns:
+            New boolean array of live cells
+        """
+        k = self.neighbours.shape[1]
+        born = np.zeros(k + 1, dtype=bool)
+        born[list(birth)] = True
+        stays = np.zeros(k + 1, dtype=bool)
+        stays[list(survive)] = True
+        counts = self.neighbour_count(alive)
+        return np.where(alive, stays[counts], born[counts])
+
+    def flood_step(
+        self,
+        filled: np.ndarray,
+        mask: np.ndarray = None
+    ) -> np.ndarray:
+        """
+        Grow a filled region by one step.
+
+        Args:
+            filled: Boolean array of filled LEDs
+            mask: Optional boolean array of LEDs that may be filled
+
+        Returns:
+            New boolean array of filled LEDs
+        """
+        grown = filled | np.logical_and(
+            self.gather(filled), self.valid
+        ).any(axis=1)
+        if mask is not None:
+            grown &= mask | filled
+        return grown
+
+    def flood_fill(
+        self,
+        seeds: np.ndarray,
+        mask: np.ndarray = None,
+        max_steps: int = None
+    ) -> np.ndarray:
+        """
+        Number of steps for a flood fill from seeds to reach each LED.
+
+        Args:
+            seeds: LED numbers (or a boolean array) to start from
+            mask: Optional boolean array of LEDs that may be filled
+            max_steps: Maximum number of steps
+
+        Returns:
+            Integer array of steps from the seeds (0 for the seeds
+            themselves, -1 for LEDs that were not reached)
+        """
+        filled = np.zeros(self.num_leds, dtype=bool)
+        filled[seeds] = True
+        steps = np.where(filled, 0, -1)
+        step = 0
+        while max_steps is None or step < max_steps:
+            grown = self.flood_step(filled, mask)
+            new = grown & ~filled
+            if not new.any():
+                break
+            step += 1
+            steps[new] = step
+            filled = grown
+        return steps
+
+
+# Example usage
+if __name__ == "__main__":
+    import time
+
+    effects = NeighbourEffects()
+    rng = np.random.default_rng(0)
+    n_repeats = 1000
+
+    state = rng.random((effects.num_leds, 3), dtype=np.float32)
+    u = np.zeros(effects.num_leds, dtype=np.float32)
+    u_prev = u.copy()
+    u[0] = 1.0
+    alive = rng.random(effects.num_leds) < 0.3
+    tests = {
+        'diffuse': lambda: effects.diffuse(state, out=state),
+        'wave_step': lambda: effects.wave_step(u, u_prev),
+        'life_step': lambda: effects.life_step(alive),
+        'flood_step': lambda: effects.flood_step(alive),
+    }
+    for name, step in tests.items():
+        t0 = time.perf_counter()
+        for _ in range(n_repeats):
+            step()
+        t = (time.perf_counter() - t0) / n_repeats
+        print(f"{name}: {t * 1e6:.1f} us per step")
+    steps = effects.flood_fill([0])
+    print(f"flood_fill from LED 0 reaches all LEDs in {steps.max()} steps")
@@ -0,0 +1,421 @@
+import numpy as np
+from octows2811 import OctoPacker
+
+
+# Frame formats
+RAW = 'raw'  # Header marker followed by RGB data of every LED
+DELTA = 'delta'  # Full 'A' update or 'N' batch of changed LEDs
+COMPRESSED = 'compressed'  # Shortest of 'A', 'N', 'L' and 'P' updates
+RGB565 = 'rgb565'  # 16-bit colour 'H' updates
+LEVELS = 'levels'  # 15-bit (5-bit intensity level) 'F' updates
+FRAME_SYNC = 'frame sync'  # videodisplay1593 '*' and '%' frames
+FRAME_FORMATS = (RAW, DELTA, COMPRESSED, RGB565, LEVELS, FRAME_SYNC)
+
+# serial_read_1593 command codes
+FULL_UPDATE = ord('A')
+BATCH_UPDATE = ord('N')
+RUN_LENGTH_UPDATE = ord('L')
+PALETTE_UPDATE = ord('P')
+RGB565_UPDATE = ord('H')
+LEVELS_UPDATE = ord('F')
+
+# videodisplay1593 command codes
+MASTER_FRAME = ord('*')  # Frame, then send the frame sync pulse
+SLAVE_FRAME = ord('%')  # Frame, then wait for the frame sync pulse
+
+# Built-in palette of the 'P' command.  Must match the colourSet
+# array followed by the colourArray array in arraydata.h
+BUILTIN_PALETTE = np.array([
+    # colourSet
+    0x000000, 0x240000, 0x002000, 0x242000,
+    0x000030, 0x240030, 0x002030, 0x242030,
+    # colourArray
+    0x000000, 0x030000, 0x070000, 0x0a0000, 0x0e0000, 0x110000, 0x150000,
+    0x180000, 0x1c0000, 0x1f0000, 0x230000, 0x260000, 0x2a0000, 0x2d0000,
+    0x310000, 0x340000, 0x380000, 0x340500, 0x310a00, 0x2d0f00, 0x2a1400,
+    0x261900, 0x231e00, 0x1f2300, 0x1c2800, 0x182d00, 0x153200, 0x113700,
+    0x0e3c00, 0x0a4100, 0x074600, 0x034b00, 0x005000, 0x004b08, 0x004610,
+    0x004118, 0x003c20, 0x003728, 0x003230, 0x002d38, 0x002840, 0x002348,
+    0x001e50, 0x001958, 0x001460, 0x000f68, 0x000a70, 0x000578, 0x000080,
+    0x040480, 0x080880, 0x0c0c80, 0x101080, 0x141480, 0x181880, 0x1c1c80,
+    0x202080, 0x242480, 0x282880, 0x2c2c80, 0x303080, 0x343480, 0x383880,
+    0x3c3c80
+], dtype=np.uint32)
+
+# Longest run of one 'L' command record
+MAX_RUN_LENGTH = 255
+
+
+class RawFrameEncoder:
+    """
+    Encodes frames as a header marker followed by the RGB values
+    of every LED (the protocol of arduino-fastled-controller.ino).
+
+    The frame is kept in a preallocated buffer that already contains
+    the header so each encoded frame can be sent with one write
+    without copying.  Frames rendered directly into self.frame (a
+    NumPy view of the buffer) are not copied at all.
+    """
+
+    def __init__(
+        self,
+        num_leds: int,
+        header_marker: int = 0xAB,
+        seq_header_marker: int = 0xAC
+    ):
+        """
+        Initialize the encoder.
+
+        Args:
+            num_leds: Number of LEDs in each segment
+            header_marker: Byte sent at the start of each frame
+            seq_header_marker: Byte sent at the start of each frame
+                that is followed by a sequence number
+        """
+        self.header_marker = header_marker
+        self.seq_header_marker = seq_header_marker
+
+        # Buffer layout is [seq_header_marker, seq, RGB data...] or,
+        # without a sequence number, [header_marker, RGB data...]
+        # starting at the second byte
+        self.buffer = bytearray(2 + 3 * num_leds)
+        self.buffer[0] = seq_header_marker
+        self.frame = np.frombuffer(
+            self.buffer, dtype=np.uint8, offset=2
+        ).reshape(num_leds, 3)
+
+    def encode(self, segment: np.ndarray, seq: int = None) -> memoryview:
+        """
+        Encode one device's segment of a frame.
+
+        Args:
+            segment: Numpy array with shape (n, 3) of RGB values
+            seq: Optional sequence number (0-255) to send with frame
+
+        Returns:
+            Bytes to send to the device (valid until the next call)
+        """
+        if segment is not self.frame:
+            np.copyto(self.frame, segment, casting='unsafe')
+        if seq is None:
+            self.buffer[1] = self.header_marker
+            return memoryview(self.buffer)[1:]
+        self.buffer[1] = seq
+        return memoryview(self.buffer)
+
+    def commit(self):
+        """Called when the last encoded frame was acknowledged."""
+        pass
+
+    def reset(self):
+        """Called when the last encoded frame may not have arrived."""
+        pass
+
+
+class DeltaFrameEncoder:
+    """
+    Encodes frames using the serial_read_1593.ino command set as
+    either an 'A' update of all LEDs or an 'N' batch update of only
+    the LEDs that changed since the last acknowledged frame,
+    whichever is fewer bytes.
+
+    'A' command: 'A' followed by the RGB values of every LED.
+    'N' command: 'N', 16-bit count n, then n records of 16-bit Teensy
+        pixel number and RGB values.  All 16-bit values are big-endian.
+    """
+
+    def __init__(self, pixel_index: np.ndarray):
+        """
+        Initialize the encoder.
+
+        Args:
+            pixel_index: Teensy (OctoWS2811) pixel number of each LED
+                in the segment (see display1593.make_pixel_indices)
+        """
+        num_leds = len(pixel_index)
+        self.num_leds = num_leds
+        self.pixel_bytes = np.empty((num_leds, 2), dtype=np.uint8)
+        self.pixel_bytes[:, 0] = np.asarray(pixel_index) >> 8
+        self.pixel_bytes[:, 1] = np.asarray(pixel_index) & 0xff
+        self.reference = np.zeros((num_leds, 3), dtype=np.uint8)
+        self.pending = np.zeros((num_leds, 3), dtype=np.uint8)
+        self.reference_valid = False
+        self.full_size = 1 + 3 * num_leds
+
+    def encode(self, segment: np.ndarray, seq: int = None) -> bytes:
+        """
+        Encode one device's segment of a frame.
+
+        Args:
+            segment: Numpy array with shape (n, 3) of RGB values
+            seq: Not supported by serial_read_1593 (must be None)
+
+        Returns:
+            Bytes to send to the device
+        """
+        if seq is not None:
+            raise ValueError("delta frames do not support sequence numbers")
+        np.copyto(self.pending, segment, casting='unsafe')
+        if self.reference_valid:
+            changed = np.flatnonzero(
+                (self.pending != self.reference).any(axis=1)
+            )
+            n = len(changed)
+            if 3 + 5 * n < self.full_size:
+                records = np.empty((n, 5), dtype=np.uint8)
+                records[:, :2] = self.pixel_bytes[changed]
+                records[:, 2:] = self.pending[changed]
+                return bytes([BATCH_UPDATE]) + n.to_bytes(2, 'big') \
+                    + records.tobytes()
+        return bytes([FULL_UPDATE]) + self.pending.tobytes()
+
+    def commit(self):
+        """Called when the last encoded frame was acknowledged.  It
+        becomes the reference for the next frame."""
+        self.reference, self.pending = self.pending, self.reference
+        self.reference_valid = True
+
+    def reset(self):
+        """Called when the last encoded frame may not have arrived.
+        The next frame will be a full update."""
+        self.reference_valid = False
+
+
+class CompressedFrameEncoder(DeltaFrameEncoder):
+    """
+    Encodes frames using whichever of the following serial_read_1593
+    commands is fewest bytes for each frame:
+
+    'A' command: all RGB values (see DeltaFrameEncoder).
+    'N' command: batch of changed LEDs (see DeltaFrameEncoder).
+    'L' command: run-length encoded frame.  'L' followed by runs of
+        a count (1-255) and the RGB values of that many consecutive
+        LEDs, until all LEDs are covered.
+    'P' command: palette indexed frame.  'P', palette size k, k RGB
+        values, then one palette index per LED.  If k is 0 no colours
+        are sent and the indices refer to BUILTIN_PALETTE (the
+        colourSet and colourArray tables in arraydata.h).
+    """
+
+    def __init__(self, pixel_index: np.ndarray):
+        super().__init__(pixel_index)
+        order = np.argsort(BUILTIN_PALETTE, kind='stable')
+        self.builtin_sorted = BUILTIN_PALETTE[order]
+        self.builtin_order = order.astype(np.uint8)
+        self.colours = np.zeros(self.num_leds, dtype=np.uint32)
+
+    def encode(self, segment: np.ndarray, seq: int = None) -> bytes:
+        """
+        Encode one device's segment of a frame.
+
+        Args:
+            segment: Numpy array with shape (n, 3) of RGB values
+            seq: Not supported by serial_read_1593 (must be None)
+
+        Returns:
+            Bytes to send to the device
+        """
+        packet = super().encode(segment, seq)
+        frame = self.pending
+        n = self.num_leds
+
+        # Run-length encoding
+        starts = np.flatnonzero(
+            np.concatenate(([True], (frame[1:] != frame[:-1]).any(axis=1)))
+        )
+        lengths = np.diff(np.append(starts, n))
+        pieces = (lengths + MAX_RUN_LENGTH - 1) // MAX_RUN_LENGTH
+        n_runs = int(pieces.sum())
+        if 1 + 4 * n_runs < len(packet):
+            packet = self.run_length_packet(frame, starts, lengths, pieces)
+
+        # Palette encoding (only possible if the frame has 255 colours
+        # or fewer)
+        if 2 + n < len(packet):
+            np.bitwise_or(frame[:, 0].astype(np.uint32) << 16,
+                          frame[:, 1].astype(np.uint32) << 8,
+                          out=self.colours)
+            self.colours |= frame[:, 2]
+            palette_packet = self.palette_packet(self.colours)
+            if palette_packet is not None \
+                    and len(palette_packet) < len(packet):
+                packet = palette_packet
+
+        return packet
+
+    def run_length_packet(self, frame, starts, lengths, pieces):
+        # Split runs longer than MAX_RUN_LENGTH into several records
+        n_runs = int(pieces.sum())
+        piece_num = np.arange(n_runs) - np.repeat(
+            np.cumsum(pieces) - pieces, pieces
+        )
+        piece_starts = np.repeat(starts, pieces) + MAX_RUN_LENGTH * piece_num
+        records = np.empty((n_runs, 4), dtype=np.uint8)
+        records[:, 0] = np.minimum(
+            np.repeat(lengths, pieces) - MAX_RUN_LENGTH * piece_num,
+            MAX_RUN_LENGTH
+        )
+        records[:, 1:] = frame[piece_starts]
+        return bytes([RUN_LENGTH_UPDATE]) + records.tobytes()
+
+    def palette_packet(self, colours):
+        # Use the built-in palette if it contains every colour
+        i = np.searchsorted(self.builtin_sorted, colours)
+        np.minimum(i, len(self.builtin_sorted) - 1, out=i)
+        if (self.builtin_sorted[i] == colours).all():
+            return bytes([PALETTE_UPDATE, 0]) \
+                + self.builtin_order[i].tobytes()
+
+        palette, indices = np.unique(colours, return_inverse=True)
+        k = len(palette)
+        if k > 255:
+            return None
+        palette_rgb = np.empty((k, 3), dtype=np.uint8)
+        palette_rgb[:, 0] = palette >> 16
+        palette_rgb[:, 1] = palette >> 8
+        palette_rgb[:, 2] = palette
+        return bytes([PALETTE_UPDATE, k]) + palette_rgb.tobytes() \
+            + indices.astype(np.uint8).tobytes()
+
+
+class ReducedDepthFrameEncoder:
+    """
+    Encodes frames with 16 bits per LED instead of 24 using one of
+    the following serial_read_1593 commands:
+
+    'H' command (RGB565): 'H' followed by one 16-bit value per LED
+        with 5 bits of red, 6 bits of green and 5 bits of blue.
+    'F' command (LEVELS): 'F' followed by one 16-bit value per LED
+        with 5 bits each of red, green and blue.  These are
+        intensity levels (0 to INTLEVELS - 1) which the firmware
+        converts to LED values with the colourScale tables in
+        arraydata.h, so frame values are treated as perceived
+        intensities rather than raw LED values.
+
+    All 16-bit values are big-endian.
+    """
+
+    def __init__(self, num_leds: int, depth_format: str = RGB565):
+        """
+        Initialize the encoder.
+
+        Args:
+            num_leds: Number of LEDs in each segment
+            depth_format: RGB565 or LEVELS
+        """
+        if depth_format == RGB565:
+            self.command = RGB565_UPDATE
+            self.shifts = (3, 2, 3)
+            self.positions = (11, 5, 0)
+        elif depth_format == LEVELS:
+            self.command = LEVELS_UPDATE
+            self.shifts = (3, 3, 3)
+            self.positions = (10, 5, 0)
+        else:
+            raise ValueError(f"invalid depth_format: {depth_format!r}")
+        self.channel = np.zeros(num_leds, dtype=np.uint16)
+        self.words = np.zeros(num_leds, dtype=np.uint16)
+        self.packet = np.zeros(num_leds, dtype='>u2')
+
+    def encode(self, segment: np.ndarray, seq: int = None) -> bytes:
+        """
+        Encode one device's segment of a frame.
+
+        Args:
+            segment: Numpy array with shape (n, 3) of RGB values
+            seq: Not supported by serial_read_1593 (must be None)
+
+        Returns:
+            Bytes to send to the device
+        """
+        if seq is not None:
+            raise ValueError("reduced depth frames do not support sequence "
+                             "numbers")
+        self.words[:] = 0
+        for c, (shift, position) in enumerate(zip(self.shifts, self.positions)):
+            np.right_shift(segment[:, c], shift, out=self.channel,
+                           casting='unsafe')
+            np.left_shift(self.channel, position, out=self.channel)
+            self.words |= self.channel
+        self.packet[:] = self.words
+        return bytes([self.command]) + self.packet.tobytes()
+
+    def commit(self):
+        """Called when the last encoded frame was acknowledged."""
+        pass
+
+    def reset(self):
+        """Called when the last encoded frame may not have arrived."""
+        pass
+
+
+class FrameSyncEncoder:
+    """
+    Encodes frames for videodisplay1593.ino, which reads OctoWS2811
+    drawingMemory straight from the serial port and updates the LEDs
+    on the falling edge of a frame sync signal shared by the boards
+    (pin 12).
+
+    '*' command (master): '*', 16-bit time from the first byte of the
+        frame until the sync pulse (microseconds), then drawingMemory.
+    '%' command (slave): '%', 16 unused bits, then drawingMemory.
+        The board waits up to 30 ms for the master's sync pulse.
+
+    16-bit values are little-endian.  Frames are not acknowledged.
+    """
+
+    def __init__(
+        self,
+        pixel_index: np.ndarray,
+        master: bool,
+        max_leds_per_strip: int = 100,
+        colour_order: str = 'RGB'
+    ):
+        """
+        Initialize the encoder.
+
+        Args:
+            pixel_index: Teensy (OctoWS2811) pixel number of each LED
+                in the segment (see display1593.make_pixel_indices)
+            master: True for the board that sends the frame sync
+                pulse, False for boards that wait for it
+            max_leds_per_strip: ledsPerStrip in the firmware
+            colour_order: Colour order of the LEDs, e.g. 'RGB'
+        """
+        self.packer = OctoPacker(pixel_index, max_leds_per_strip,
+                                 colour_order)
+        self.master = master
+        self.usec_until_frame_sync = 0
+        self.buffer = bytearray(3 + self.packer.size)
+        self.buffer[0] = MASTER_FRAME if master else SLAVE_FRAME
+        self.drawing_memory = np.frombuffer(
+            self.buffer, dtype=np.uint8, offset=3
+        )
+
+    def encode(self, segment: np.ndarray, seq: int = None) -> memoryview:
+        """
+        Encode one device's segment of a frame.
+
+        Args:
+            segment: Numpy array with shape (n, 3) of RGB values
+            seq: Not supported by videodisplay1593 (must be None)
+
+        Returns:
+            Bytes to send to the device (valid until the next call)
+        """
+        if seq is not None:
+            raise ValueError("frame sync frames do not support sequence "
+                             "numbers")
+        if self.master:
+            usec = min(max(int(self.usec_until_frame_sync), 0), 0xffff)
+            self.buffer[1:3] = usec.to_bytes(2, 'little')
+        self.packer.pack(segment, out=self.drawing_memory)
+        return memoryview(self.buffer)
+
+    def commit(self):
+        """Called when the last encoded frame was acknowledged."""
+        pass
+
+    def reset(self):
+        """Called when the last encoded frame may not have arrived."""
+        pass
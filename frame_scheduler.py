@@ -0,0 +1,162 @@
+import time
+from collections import deque
+import numpy as np
+
+
+# Policies for what to do when playback falls behind schedule
+DROP = 'drop'  # Don't send frames that are late, wait for the next
+SKIP_TO_LATEST = 'skip to latest'  # Send the latest frame that is due
+SLOW_DOWN = 'slow down'  # Send every frame, delaying the rest
+LATE_POLICIES = (DROP, SKIP_TO_LATEST, SLOW_DOWN)
+
+
+class FrameScheduler:
+    """
+    Frame clock based on monotonic deadlines.
+
+    Frame n is due at start + n / fps, measured with
+    time.perf_counter_ns, so timing errors do not accumulate from
+    frame to frame.  When a frame is late by more than the
+    tolerance, the late policy decides whether it is dropped,
+    whether playback skips ahead to the latest frame that is due,
+    or whether the rest of the schedule is pushed back.
+
+    Sleeps can overshoot by a millisecond or more (especially on a
+    Raspberry Pi), so the last spin_time seconds before each deadline
+    can be spent busy-waiting instead.
+    """
+
+    def __init__(
+        self,
+        fps: float,
+        policy: str = SKIP_TO_LATEST,
+        spin_time: float = 0.0,
+        tolerance: float = None,
+        stats_window: int = 240
+    ):
+        """
+        Initialize the scheduler.
+
+        Args:
+            fps: Frames per second
+            policy: What to do when behind schedule (DROP,
+                SKIP_TO_LATEST or SLOW_DOWN)
+            spin_time: Time before each deadline to busy-wait
+                rather than sleep (seconds)
+            tolerance: How late a frame can be before the policy is
+                applied (seconds, defaults to half a frame)
+            stats_window: Number of recent frames used to calculate
+                the statistics
+        """
+        if policy not in LATE_POLICIES:
+            raise ValueError(f"invalid policy: {policy!r}")
+        if fps <= 0:
+            raise ValueError("fps must be positive")
+        self.fps = fps
+        self.policy = policy
+        self.period_ns = int(round(1e9 / fps))
+        self.spin_ns = int(spin_time * 1e9)
+        self.tolerance_ns = self.period_ns // 2 if tolerance is None \
+            else int(tolerance * 1e9)
+        self.start_ns = None
+        self.send_times = deque(maxlen=stats_window)
+        self.lateness = deque(maxlen=stats_window)
+        self.frames_shown = 0
+        self.frames_dropped = 0
+
+    def start(self, start_ns: int = None):
+        """
+        Start the clock.
+
+        Args:
+            start_ns: time.perf_counter_ns() value at which frame 0
+                is due (e.g. to synchronize with an audio clock),
+                defaults to now
+        """
+        self.start_ns = time.perf_counter_ns() if start_ns is None \
+            else start_ns
+        self.send_times.clear()
+        self.lateness.clear()
+        self.frames_shown = 0
+        self.frames_dropped = 0
+
+    def deadline(self, n: int) -> int:
+        """Time that frame n is due (perf_counter_ns)."""
+        return self.start_ns + n * self.period_ns
+
+    def sleep_until(self, deadline_ns: int):
+        """Sleep, then busy-wait for the last spin_time, until the
+        deadline."""
+        while True:
+            remaining = deadline_ns - time.perf_counter_ns()
+            if remaining <= 0:
+                return
+            if remaining > self.spin_ns:
+                time.sleep((remaining - self.spin_ns) / 1e9)
+
+    def frames(self, num_frames: int, loop: bool = False):
+        """
+        Generate the number of each frame when it is time to send it.
+
+        The clock is started when the first frame is requested.
+
+        Args:
+            num_frames: Number of frames in the video
+            loop: Whether to loop the video
+
+        Yields:
+            Frame numbers (0 to num_frames - 1)
+        """
+        if num_frames <= 0:
+            raise ValueError("num_frames must be positive")
+        self.start()
+        n = 0
+        while loop or n < num_frames:
+            deadline = self.deadline(n)
+            late = time.perf_counter_ns() - deadline
+            if late > self.tolerance_ns:
+                if self.policy == DROP:
+                    self.frames_dropped += 1
+                    n += 1
+                    continue
+                elif self.policy == SKIP_TO_LATEST:
+                    latest = (late + deadline - self.start_ns) \
+                        // self.period_ns
+                    if not loop:
+                        latest = min(latest, num_frames - 1)
+                    self.frames_dropped += latest - n
+                    n = latest
+                else:
+                    # Push the rest of the schedule back
+                    self.start_ns += late
+                deadline = self.deadline(n)
+            self.sleep_until(deadline)
+            t = time.perf_counter_ns()
+            self.send_times.append(t)
+            self.lateness.append(t - deadline)
+            self.frames_shown += 1
+            yield n % num_frames
+            n += 1
+
+    def stats(self) -> dict:
+        """
+        Playback statistics over the last stats_window frames.
+
+        Returns:
+            Dictionary with the achieved fps, the jitter (standard
+            deviation of the time between frames), the mean and
+            maximum lateness of frames (all times in milliseconds)
+            and the total numbers of frames shown and dropped
+        """
+        intervals = np.diff(np.array(self.send_times, dtype=np.int64)) / 1e6
+        lateness = np.array(self.lateness, dtype=np.int64) / 1e6
+        return {
+            'fps': float(1000 / intervals.mean()) if len(intervals) else 0.0,
+            'jitter_ms': float(intervals.std()) if len(intervals) else 0.0,
+            'mean_lateness_ms': float(lateness.mean()) if len(lateness)
+            else 0.0,
+            'max_lateness_ms': float(lateness.max()) if len(lateness)
+            else 0.0,
+            'frames_shown': self.frames_shown,
+            'frames_dropped': self.frames_dropped
+        }
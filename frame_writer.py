@@ -0,0 +1,420 @@
+import threading
+import time
+from collections import deque, OrderedDict
+import numpy as np
+from serial import SerialException
+
+
+# Policies for what to do when a new frame is queued and the
+# frame buffer queue is full
+BLOCK = 'block'
+DROP_OLDEST = 'drop oldest'
+DROP_NEWEST = 'drop newest'
+QUEUE_FULL_POLICIES = (BLOCK, DROP_OLDEST, DROP_NEWEST)
+
+
+class FrameWriter(threading.Thread):
+    """
+    Background thread that sends queued frames to one device.
+
+    Frames are copied into a small ring of preallocated buffers so
+    that the caller can go on rendering the next frame while the
+    previous one is being written to the serial port.
+    """
+
+    def __init__(
+        self,
+        send: callable,
+        shape: tuple,
+        queue_size: int = 2,
+        full_policy: str = BLOCK,
+        name: str = None,
+        condition: threading.Condition = None
+    ):
+        """
+        Initialize the frame writer.
+
+        Args:
+            send: Function called (from the writer thread) with each
+                queued frame buffer.  Should return True if the frame
+                was sent successfully.
+            shape: Shape of the frames to be queued, e.g. (798, 3)
+            queue_size: Number of preallocated frame buffers
+            full_policy: What to do when a frame is queued and all
+                buffers are in use, one of BLOCK (wait for a free
+                buffer), DROP_OLDEST (replace the oldest queued frame)
+                or DROP_NEWEST (discard the new frame).  With
+                DROP_OLDEST, if no frames are queued because the
+                writer thread is sending from every buffer, put waits
+                for a buffer to be free
+            name: Thread name
+            condition: Condition to share with other writers (see
+                put_all)
+        """
+        if full_policy not in QUEUE_FULL_POLICIES:
+            raise ValueError(f"invalid full_policy: {full_policy!r}")
+        if queue_size < 1:
+            raise ValueError("queue_size must be at least 1")
+        super().__init__(name=name, daemon=True)
+        self.send = send
+        self.full_policy = full_policy
+        self.buffers = [np.zeros(shape, dtype=np.uint8)
+                        for _ in range(queue_size)]
+        self.free_slots = list(range(queue_size))
+        self.queued_slots = deque()  # (slot, frame number)
+        self.condition = condition or threading.Condition()
+        self.stopping = False
+        self.frames_queued = 0
+        self.frames_sent = 0
+        self.frames_dropped = 0
+        self.send_errors = 0
+
+    def put(self, frame: np.ndarray, index: np.ndarray = None) -> bool:
+        """
+        Queue a frame to be sent.
+
+        Args:
+            frame: Numpy array of RGB values with the same shape as
+                the frame buffers
+            index: Optional integer array of the rows of frame to
+                queue (e.g. one device's segment of a full frame)
+
+        Returns:
+            True if the frame was queued, False if it was dropped
+        """
+        with self.condition:
+            if self.stopping:
+                return False
+            while not self.free_slots:
+                if self.stopping:
+                    return False
+                if self.full_policy == DROP_NEWEST:
+                    self.frames_dropped += 1
+                    return False
+                if self.full_policy == DROP_OLDEST and self.queued_slots:
+                    self.free_slots.append(self.queued_slots.popleft()[0])
+                    self.frames_dropped += 1
+                    break
+                # BLOCK, or DROP_OLDEST when the only buffers are
+                # being sent by the writer thread (none are queued)
+                self.condition.wait()
+            slot = self.free_slots.pop()
+
+        # The slot is owned by this thread until it is queued
+        self.fill(slot, frame, index)
+
+        with self.condition:
+            self.queue(slot)
+            self.condition.notify_all()
+        return True
+
+    def fill(self, slot: int, frame: np.ndarray, index: np.ndarray = None):
+        """Copy a frame (or the rows of it in index) into a buffer."""
+        if index is None:
+            np.copyto(self.buffers[slot], frame, casting='unsafe')
+        else:
+            np.take(frame, index, axis=0, out=self.buffers[slot],
+                    mode='clip')
+
+    def queue(self, slot: int):
+        """Queue a filled buffer to be sent.
+        Must be called with self.condition held."""
+        self.queued_slots.append((slot, self.frames_queued))
+        self.frames_queued += 1
+
+    def drop_queued(self, number: int):
+        """Drop the queued frame with the given frame number.
+        Must be called with self.condition held."""
+        for entry in self.queued_slots:
+            if entry[1] == number:
+                self.queued_slots.remove(entry)
+                self.free_slots.append(entry[0])
+                self.frames_dropped += 1
+                return
+
+    def run(self):
+        while True:
+            with self.condition:
+                while not self.queued_slots and not self.stopping:
+                    self.condition.wait()
+                if not self.queued_slots:
+                    return
+                slot = self.queued_slots.popleft()[0]
+
+            if self.send(self.buffers[slot]):
+                self.frames_sent += 1
+            else:
+                self.send_errors += 1
+
+            with self.condition:
+                self.free_slots.append(slot)
+                self.condition.notify_all()
+
+    def join_queue(self, timeout: float = None) -> bool:
+        """
+        Wait until all queued frames have been sent.
+
+        Args:
+            timeout: Maximum time to wait (seconds)
+
+        Returns:
+            True if the queue is empty, False if timed out
+        """
+        with self.condition:
+            return self.condition.wait_for(
+                lambda: len(self.free_slots) == len(self.buffers),
+                timeout=timeout
+            )
+
+    def stop(self, timeout: float = None):
+        """
+        Stop the writer thread after any queued frames are sent.
+
+        Args:
+            timeout: Maximum time to wait for the thread to finish
+        """
+        with self.condition:
+            self.stopping = True
+            self.condition.notify_all()
+        if self.is_alive():
+            self.join(timeout=timeout)
+
+
+def put_all(
+    writers: list,
+    frames: list,
+    indices: list = None
+) -> bool:
+    """
+    Queue one frame on several writers, e.g. a segment per device.
+
+    The writers' full_policy is applied to the frame as a whole, so
+    a frame is either queued on every writer or dropped on every
+    writer, and each device shows the same frames.  With
+    DROP_NEWEST, the frame is dropped if any writer's buffers are
+    all in use.  With DROP_OLDEST, the oldest frame that is still
+    queued on every writer is dropped, or if any writer has already
+    started sending every queued frame, put_all waits for a buffer
+    to be free.
+
+    The writers must share one condition and full_policy, and
+    frames must only be queued on them with put_all, which numbers
+    the frames in the same order on each writer.
+
+    Args:
+        writers: List of FrameWriters
+        frames: List of numpy arrays of RGB values to queue, one per
+            writer (these may all be the same full frame if indices
+            is given)
+        indices: Optional list of integer arrays, one per writer,
+            of the rows of each frame to queue
+
+    Returns:
+        True if the frame was queued, False if it was dropped
+    """
+    condition = writers[0].condition
+    full_policy = writers[0].full_policy
+    if any(writer.condition is not condition or
+           writer.full_policy != full_policy for writer in writers):
+        raise ValueError("writers must share a condition and full_policy")
+    if indices is None:
+        indices = [None] * len(writers)
+
+    with condition:
+        while True:
+            if any(writer.stopping for writer in writers):
+                return False
+            if all(writer.free_slots for writer in writers):
+                break
+            if full_policy == DROP_NEWEST:
+                for writer in writers:
+                    writer.frames_dropped += 1
+                return False
+            if full_policy == DROP_OLDEST and \
+                    all(writer.queued_slots for writer in writers):
+                # Oldest frame no writer has started sending
+                number = max(writer.queued_slots[0][1]
+                             for writer in writers)
+                if all(writer.queued_slots[-1][1] >= number
+                       for writer in writers):
+                    for writer in writers:
+                        writer.drop_queued(number)
+                    continue
+            # BLOCK, or DROP_OLDEST when no frame is still queued on
+            # every writer
+            condition.wait()
+        slots = [writer.free_slots.pop() for writer in writers]
+
+    # The slots are owned by this thread until they are queued
+    for writer, slot, frame, index in zip(writers, slots, frames, indices):
+        writer.fill(slot, frame, index)
+
+    with condition:
+        for writer, slot in zip(writers, slots):
+            writer.queue(slot)
+        condition.notify_all()
+    return True
+
+
+class AckWindow:
+    """
+    Sliding window of frames sent to one device that have not yet
+    been acknowledged.
+
+    Instead of waiting for each frame's acknowledgment before
+    sending the next (stop-and-wait), up to window_size frames may
+    be outstanding at once.  Each frame carries a sequence number
+    which the device echoes back after the ACK code, and a
+    background reader thread consumes the acknowledgments.
+    """
+
+    def __init__(
+        self,
+        ser,
+        window_size: int = 4,
+        ack_timeout: float = 1.0,
+        ack_code: bytes = b'A'
+    ):
+        """
+        Initialize the acknowledgment window.
+
+        Args:
+            ser: Serial connection to the device
+            window_size: Maximum number of unacknowledged frames
+            ack_timeout: Time after which an unacknowledged frame is
+                considered lost (seconds)
+            ack_code: Byte sent by the device before each sequence
+                number
+        """
+        if not 1 <= window_size < 256:
+            raise ValueError("window_size must be between 1 and 255")
+        self.ser = ser
+        self.window_size = window_size
+        self.ack_timeout = ack_timeout
+        self.ack_code = ack_code
+        self.outstanding = OrderedDict()  # sequence number: time sent
+        self.next_seq = 0
+        self.condition = threading.Condition()
+        self.stopping = False
+        self.reader = None
+        self.frames_acked = 0
+        self.frames_lost = 0
+
+    def start(self):
+        """Start the background acknowledgment reader."""
+        self.reader = threading.Thread(
+            target=self.read_acks, name="AckReader", daemon=True
+        )
+        self.reader.start()
+
+    def stop(self, timeout: float = None):
+        """
+        Wait for outstanding acknowledgments and stop the reader.
+
+        Args:
+            timeout: Maximum time to wait for outstanding frames
+                (defaults to ack_timeout)
+        """
+        self.join(self.ack_timeout if timeout is None else timeout)
+        with self.condition:
+            self.stopping = True
+            self.condition.notify_all()
+        if hasattr(self.ser, 'cancel_read'):
+            self.ser.cancel_read()
+        if self.reader is not None:
+            self.reader.join()
+            self.reader = None
+
+    def expire(self):
+        """Discard frames that have waited longer than ack_timeout.
+        Must be called with self.condition held."""
+        now = time.monotonic()
+        while self.outstanding:
+            seq, t_sent = next(iter(self.outstanding.items()))
+            if now - t_sent < self.ack_timeout:
+                break
+            del self.outstanding[seq]
+            self.frames_lost += 1
+
+    def acquire(self, timeout: float = None) -> int:
+        """
+        Wait for space in the window and reserve the next sequence
+        number for a frame that is about to be sent.
+
+        Args:
+            timeout: Maximum time to wait (seconds)
+
+        Returns:
+            Sequence number (0-255), or None if timed out
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self.condition:
+            while True:
+                self.expire()
+                if len(self.outstanding) < self.window_size:
+                    break
+                if self.stopping:
+                    return None
+                # Wake up when the oldest frame would expire
+                oldest = next(iter(self.outstanding.values()))
+                wait_until = oldest + self.ack_timeout
+                if deadline is not None:
+                    if time.monotonic() >= deadline:
+                        return None
+                    wait_until = min(wait_until, deadline)
+                self.condition.wait(max(0.0, wait_until - time.monotonic()))
+            seq = self.next_seq
+            self.next_seq = (seq + 1) % 256
+            self.outstanding[seq] = time.monotonic()
+            return seq
+
+    def acknowledge(self, seq: int):
+        """
+        Record an acknowledgment received from the device.
+
+        Frames are processed in order by the device so any frames
+        sent before the acknowledged one must have been lost.
+
+        Args:
+            seq: Sequence number received
+        """
+        with self.condition:
+            if seq not in self.outstanding:
+                return
+            while self.outstanding:
+                s, _ = self.outstanding.popitem(last=False)
+                if s == seq:
+                    self.frames_acked += 1
+                    break
+                self.frames_lost += 1
+            self.condition.notify_all()
+
+    def join(self, timeout: float = None) -> bool:
+        """
+        Wait until all outstanding frames are acknowledged.
+
+        Args:
+            timeout: Maximum time to wait (seconds)
+
+        Returns:
+            True if no frames are outstanding, False if timed out
+        """
+        with self.condition:
+            return self.condition.wait_for(
+                lambda: not self.outstanding, timeout=timeout
+            )
+
+    def read_acks(self):
+        """Reader thread loop."""
+        while not self.stopping:
+            try:
+                b = self.ser.read(1)
+                if b != self.ack_code:
+                    # Timed out or out of sync: keep looking for
+                    # the ACK code
+                    continue
+                seq = self.ser.read(1)
+            except SerialException:
+                break
+            if len(seq) == 1:
+                self.acknowledge(seq[0])
@@ -0,0 +1,148 @@
+import functools
+import hashlib
+import os
+import re
+import numpy as np
+
+
+# Header file containing the physical co-ordinates and nearest
+# neighbours of the LEDs (used by the Teensy firmware)
+ARRAYDATA_PATH = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)),
+    'serial_read_1593', 'arraydata.h'
+)
+
+# Names of the arrays in arraydata.h and their data types
+ARRAYDATA_ARRAYS = {
+    'centres_x': np.float64,
+    'centres_y': np.float64,
+    'nearestNeighbours': np.intp,
+    'nearestNeighbourDistances': np.float64
+}
+ARRAYDATA_CONSTANTS = ('numCells', 'maxNumNeighbours', 'width', 'height')
+
+
+class LEDGeometry:
+    """
+    Physical layout of the LEDs in the display.
+
+    Attributes:
+        num_leds: Number of LEDs
+        width, height: Dimensions of the display area (mm)
+        centres: (num_leds, 2) array of LED (x, y) co-ordinates (mm)
+        nearest_neighbours: (num_leds, max_num_neighbours) array of
+            the LED numbers of the nearest neighbours of each LED,
+            nearest first
+        nearest_neighbour_distances: (num_leds, max_num_neighbours)
+            array of the distances to the nearest neighbours (mm)
+    """
+
+    def __init__(
+        self,
+        centres: np.ndarray,
+        nearest_neighbours: np.ndarray,
+        nearest_neighbour_distances: np.ndarray,
+        width: float,
+        height: float
+    ):
+        self.centres = np.ascontiguousarray(centres, dtype=np.float64)
+        self.nearest_neighbours = np.ascontiguousarray(
+            nearest_neighbours, dtype=np.intp
+        )
+        self.nearest_neighbour_distances = np.ascontiguousarray(
+            nearest_neighbour_distances, dtype=np.float64
+        )
+        self.num_leds = self.centres.shape[0]
+        self.max_num_neighbours = self.nearest_neighbours.shape[1]
+        self.width = width
+        self.height = height
+
+    @property
+    def x(self) -> np.ndarray:
+        return self.centres[:, 0]
+
+    @property
+    def y(self) -> np.ndarray:
+        return self.centres[:, 1]
+
+
+def parse_arraydata(text: str) -> dict:
+    """
+    Parse the arrays and constants in the text of arraydata.h.
+
+    Args:
+        text: Contents of arraydata.h
+
+    Returns:
+        Dictionary of NumPy arrays and constants by their C names
+    """
+    # Remove comments
+    text = re.sub(r'/\*.*?\*/', '', text, flags=re.S)
+    text = re.sub(r'//[^\n]*', '', text)
+
+    data = {}
+    for name in ARRAYDATA_CONSTANTS:
+        m = re.search(r'\b' + name + r'\s*=\s*(\d+)', text)
+        if m is None:
+            raise ValueError(f"constant {name} not found in arraydata")
+        data[name] = int(m.group(1))
+    for name, dtype in ARRAYDATA_ARRAYS.items():
+        m = re.search(r'\b' + name + r'\b[^=;]*=[^{]*\{(.*?)\};', text, re.S)
+        if m is None:
+            raise ValueError(f"array {name} not found in arraydata")
+        values = re.sub(r'[{}\s]', '', m.group(1))
+        data[name] = np.array(values.strip(',').split(','), dtype=np.float64)\
+            .astype(dtype)
+
+    n = data['numCells']
+    data['nearestNeighbours'] = data['nearestNeighbours'].reshape(n, -1)
+    data['nearestNeighbourDistances'] = \
+        data['nearestNeighbourDistances'].reshape(n, -1)
+    return data
+
+
+@functools.lru_cache(maxsize=None)
+def load_geometry(path: str = ARRAYDATA_PATH, cache_dir: str = None) -> LEDGeometry:
+    """
+    Load the LED geometry from arraydata.h.
+
+    The parsed arrays are cached in a .npz file named after a hash of
+    the header file so the C source only has to be parsed again when
+    it changes.  Results are also kept in memory so repeated calls
+    are free.
+
+    Args:
+        path: Path to arraydata.h
+        cache_dir: Directory for the cache file (defaults to the
+            directory containing arraydata.h)
+
+    Returns:
+        LEDGeometry instance
+    """
+    with open(path, 'rb') as f:
+        contents = f.read()
+    digest = hashlib.sha1(contents).hexdigest()[:16]
+    if cache_dir is None:
+        cache_dir = os.path.dirname(os.path.abspath(path))
+    cache_path = os.path.join(cache_dir, f"arraydata-{digest}.npz")
+
+    try:
+        with np.load(cache_path) as cache:
+            data = {name: cache[name] for name in cache.files}
+    except (OSError, ValueError):
+        data = parse_arraydata(contents.decode('utf-8', errors='replace'))
+        try:
+            tmp_path = f"{cache_path}.{os.getpid()}.tmp"
+            with open(tmp_path, 'wb') as f:
+                np.savez(f, **data)
+            os.replace(tmp_path, cache_path)
+        except OSError:
+            pass  # Read-only location: just don't cache
+
+    return LEDGeometry(
+        np.column_stack([data['centres_x'], data['centres_y']]),
+        data['nearestNeighbours'],
+        data['nearestNeighbourDistances'],
+        float(data['width']),
+        float(data['height'])
+    )
@@ -0,0 +1,181 @@
+import numpy as np
+
+
+# Number of strips driven by each OctoWS2811 board
+NUM_STRIPS = 8
+
+# Bytes of drawingMemory per LED position (one bit of each of the 8
+# strips per byte, 24 bits per LED)
+BYTES_PER_LED = 24
+
+# Order in which each LED's colour bits are sent to the strip (this
+# must match the colour order of the LEDs because the video firmware
+# uses OctoWS2811 without any colour configuration)
+COLOUR_ORDERS = {
+    'RGB': (0, 1, 2),
+    'RBG': (0, 2, 1),
+    'GRB': (1, 0, 2),
+    'GBR': (1, 2, 0),
+    'BRG': (2, 0, 1),
+    'BGR': (2, 1, 0)
+}
+
+
+def make_bit_spread_tables(num_strips: int = NUM_STRIPS) -> np.ndarray:
+    """
+    Calculate lookup tables that spread the 8 bits of a colour value
+    over 8 bytes for each strip.
+
+    Byte k of table[i, v] (as a little-endian 64-bit integer) has
+    bit i set if bit 7 - k of v is set, i.e. it is the contribution
+    of value v on strip i to 8 consecutive drawingMemory bytes.  The
+    contributions of different strips never overlap, so the bytes for
+    all 8 strips are the sum of their table entries.
+
+    Returns:
+        Array of shape (num_strips, 256) of little-endian uint64
+    """
+    v = np.arange(256, dtype=np.uint64)
+    spread = np.zeros(256, dtype=np.uint64)
+    for k in range(8):
+        spread |= ((v >> np.uint64(7 - k)) & np.uint64(1)) << np.uint64(8 * k)
+    return np.stack([
+        spread << np.uint64(i) for i in range(num_strips)
+    ]).astype('<u8')
+
+
+class OctoPacker:
+    """
+    Converts one device's segment of a frame into OctoWS2811's
+    drawingMemory layout.
+
+    OctoWS2811 sends the 24 colour bits of the LEDs at the same
+    position on all 8 strips in parallel, so drawingMemory holds, for
+    each LED position on a strip, 24 bytes (most significant colour
+    bit first) in which bit i is the bit for strip i.  This is the
+    data that videodisplay1593.ino reads straight from the serial
+    port.
+
+    The bit transposition is done with lookup tables (see
+    make_bit_spread_tables): one table lookup per colour value
+    followed by a sum over the 8 strips.
+    """
+
+    def __init__(
+        self,
+        pixel_index: np.ndarray,
+        max_leds_per_strip: int = 100,
+        colour_order: str = 'RGB'
+    ):
+        """
+        Initialize the packer.
+
+        Args:
+            pixel_index: Teensy (OctoWS2811) pixel number of each LED
+                in the segment (see display1593.make_pixel_indices)
+            max_leds_per_strip: Number of LEDs per strip that
+                OctoWS2811 is configured for (ledsPerStrip in the
+                firmware)
+            colour_order: Colour order of the LEDs, e.g. 'RGB'
+        """
+        if colour_order not in COLOUR_ORDERS:
+            raise ValueError(f"invalid colour_order: {colour_order!r}")
+        self.pixel_index = np.asarray(pixel_index, dtype=np.intp)
+        if self.pixel_index.max() >= NUM_STRIPS * max_leds_per_strip:
+            raise ValueError("pixel numbers exceed the number of pixels")
+        self.max_leds_per_strip = max_leds_per_strip
+        self.colour_order = COLOUR_ORDERS[colour_order]
+        self.size = max_leds_per_strip * BYTES_PER_LED
+
+        # Colour values of every OctoWS2811 pixel (unused pixels
+        # stay 0), in the order the colours are sent
+        self.pixels = np.zeros(
+            (NUM_STRIPS, max_leds_per_strip, 3), dtype=np.uint8
+        )
+
+        # Work arrays for pack()
+        self.tables = make_bit_spread_tables().ravel()
+        self.strip_offsets = (
+            np.arange(NUM_STRIPS, dtype=np.uint16) * 256
+        )[:, None, None]
+        self.table_index = np.empty(self.pixels.shape, dtype=np.uint16)
+        self.words = np.empty((max_leds_per_strip, 3), dtype='<u8')
+
+    def pack(self, segment: np.ndarray, out: np.ndarray = None) -> np.ndarray:
+        """
+        Convert a segment to drawingMemory bytes.
+
+        Args:
+            segment: Numpy array with shape (n, 3) of RGB values
+            out: Optional uint8 array of length self.size for the
+                result
+
+        Returns:
+            uint8 array of drawingMemory bytes
+        """
+        pixels = self.pixels.reshape(-1, 3)
+        pixels[self.pixel_index] = segment[:, self.colour_order]
+
+        # 8 drawingMemory bytes for each position and colour channel
+        np.add(self.pixels, self.strip_offsets, out=self.table_index)
+        np.take(self.tables, self.table_index).sum(axis=0, out=self.words)
+        packed = self.words.view(np.uint8).reshape(self.size)
+        if out is None:
+            return packed.copy()
+        out[:] = packed
+        return out
+
+    def pack_unpackbits(self, segment: np.ndarray) -> np.ndarray:
+        """
+        Slower version of pack using np.unpackbits and np.packbits
+        (used to check the results of pack).
+        """
+        pixels = self.pixels.reshape(-1, 3)
+        pixels[self.pixel_index] = segment[:, self.colour_order]
+
+        # (strip, position, bit) -> (position, bit, strip) -> one
+        # byte per position and bit with strip i in bit i
+        bits = np.unpackbits(self.pixels, axis=2)
+        return np.packbits(
+            bits.transpose(1, 2, 0), axis=2, bitorder='little'
+        ).reshape(self.size)
+
+
+# Benchmark
+if __name__ == "__main__":
+    import time
+    from display1593 import NUM_LEDS, make_pixel_indices, make_segment_indices
+
+    pixel_indices = make_pixel_indices()
+    segment_indices = make_segment_indices()
+    packers = {
+        device_id: OctoPacker(pixel_index)
+        for device_id, pixel_index in pixel_indices.items()
+    }
+    buffers = {
+        device_id: np.empty(packer.size, dtype=np.uint8)
+        for device_id, packer in packers.items()
+    }
+    frame = np.random.randint(0, 256, size=(NUM_LEDS, 3), dtype=np.uint8)
+
+    def pack_frame(pack):
+        for device_id, packer in packers.items():
+            segment = frame[segment_indices[device_id]]
+            if pack == 'pack':
+                packer.pack(segment, out=buffers[device_id])
+            else:
+                buffers[device_id][:] = packer.pack_unpackbits(segment)
+
+    for device_id, packer in packers.items():
+        segment = frame[segment_indices[device_id]]
+        assert np.array_equal(packer.pack(segment),
+                              packer.pack_unpackbits(segment))
+
+    n_repeats = 1000
+    for pack in ('pack', 'pack_unpackbits'):
+        t0 = time.perf_counter()
+        for _ in range(n_repeats):
+            pack_frame(pack)
+        t = (time.perf_counter() - t0) / n_repeats
+        print(f"{pack}: {t * 1000:.3f} ms per {NUM_LEDS}-LED frame "
+              f"(target < 5 ms on a Raspberry Pi Zero)")
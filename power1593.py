@@ -0,0 +1,140 @@
+import numpy as np
+
+
+# Estimated current drawn by each WS2811 LED
+MA_PER_CHANNEL = 20.0  # At full intensity (255)
+IDLE_MA_PER_LED = 1.0  # With all channels off
+
+# Ways of reducing the current when a limit is exceeded
+SCALE_FRAME = 'frame'  # Scale the whole frame by the same factor
+SCALE_STRIP = 'strip'  # Only scale the strips that need it
+SCALING_MODES = (SCALE_FRAME, SCALE_STRIP)
+
+
+def make_strip_starts(leds_per_strip: dict) -> np.ndarray:
+    """
+    Calculate the display LED number of the first LED of each strip.
+
+    This is the Python equivalent of firstLedOfStrip.  Strips are
+    numbered in order of device id then strip number, which is the
+    order of the LEDs in a display frame (see make_pixel_indices).
+
+    Args:
+        leds_per_strip: Dictionary of the number of LEDs on each
+            strip of each device
+
+    Returns:
+        Integer array of the first LED of each strip
+    """
+    counts = [n for device_id in sorted(leds_per_strip)
+              for n in leds_per_strip[device_id]]
+    return np.concatenate([[0], np.cumsum(counts[:-1])]).astype(np.intp)
+
+
+class PowerLimiter:
+    """
+    Keeps the estimated current drawn by the LEDs within limits.
+
+    The current of each strip is estimated from the sum of its
+    channel values.  If it exceeds the limit for a strip (or the
+    total for the whole display), the frame is scaled down before
+    it is sent.
+    """
+
+    def __init__(
+        self,
+        leds_per_strip: dict,
+        strip_limit: float = None,
+        total_limit: float = None,
+        mode: str = SCALE_STRIP,
+        ma_per_channel: float = MA_PER_CHANNEL,
+        idle_ma_per_led: float = IDLE_MA_PER_LED
+    ):
+        """
+        Initialize the power limiter.
+
+        Args:
+            leds_per_strip: Dictionary of the number of LEDs on each
+                strip of each device (see display1593.LEDS_PER_STRIP)
+            strip_limit: Maximum current per strip (amps)
+            total_limit: Maximum current for the whole display (amps)
+            mode: SCALE_STRIP (scale each strip over its limit
+                separately) or SCALE_FRAME (scale all LEDs by the
+                same factor, which preserves the image)
+            ma_per_channel: Current of one channel at full intensity
+                (milliamps)
+            idle_ma_per_led: Current of an LED that is off (milliamps)
+        """
+        if mode not in SCALING_MODES:
+            raise ValueError(f"invalid mode: {mode!r}")
+        self.strip_starts = make_strip_starts(leds_per_strip)
+        self.strip_sizes = np.diff(
+            np.append(self.strip_starts, sum(map(sum, leds_per_strip.values())))
+        )
+        self.strip_limit = strip_limit
+        self.total_limit = total_limit
+        self.mode = mode
+        self.amps_per_unit = ma_per_channel / 255 / 1000
+        self.idle_amps = self.strip_sizes * idle_ma_per_led / 1000
+        self.strip_currents = np.zeros(len(self.strip_starts))
+        self.frames_limited = 0
+
+    def estimate(self, frame: np.ndarray) -> np.ndarray:
+        """
+        Estimate the current drawn by each strip.
+
+        Args:
+            frame: uint8 array with shape (num_leds, 3)
+
+        Returns:
+            Array of currents (amps), one per strip
+        """
+        sums = np.add.reduceat(frame, self.strip_starts, axis=0,
+                               dtype=np.uint32).sum(axis=1)
+        np.multiply(sums, self.amps_per_unit, out=self.strip_currents)
+        self.strip_currents += self.idle_amps
+        return self.strip_currents
+
+    def scale_factors(self, currents: np.ndarray) -> np.ndarray:
+        """Factor (0 to 1) to scale each strip by to meet the limits."""
+        scale = np.ones(len(currents))
+        variable = currents - self.idle_amps
+        with np.errstate(divide='ignore', invalid='ignore'):
+            if self.strip_limit is not None:
+                np.minimum(scale, (self.strip_limit - self.idle_amps)
+                           / variable, out=scale, where=variable > 0)
+                if self.mode == SCALE_FRAME:
+                    scale[:] = scale.min()
+            if self.total_limit is not None:
+                total = (scale * variable).sum()
+                if total > 0:
+                    np.minimum(scale, (self.total_limit -
+                               self.idle_amps.sum()) / total * scale,
+                               out=scale)
+        return np.clip(scale, 0.0, 1.0, out=scale)
+
+    def limit(self, frame: np.ndarray, out: np.ndarray = None) -> np.ndarray:
+        """
+        Scale a frame down if it would exceed the current limits.
+
+        Args:
+            frame: uint8 array with shape (num_leds, 3)
+            out: Optional uint8 array for the result (may be frame)
+
+        Returns:
+            The frame (or out) scaled if necessary.  If no scaling is
+            needed, frame is returned as is.
+        """
+        currents = self.estimate(frame)
+        if (self.strip_limit is None or currents.max() <= self.strip_limit) \
+                and (self.total_limit is None or
+                     currents.sum() <= self.total_limit):
+            return frame
+        self.frames_limited += 1
+        scale = np.repeat(self.scale_factors(currents).astype(np.float32),
+                          self.strip_sizes)
+        if out is None:
+            out = np.empty_like(frame)
+        # Rounding down guarantees the estimate stays within limits
+        np.multiply(frame, scale[:, None], out=out, casting='unsafe')
+        return out
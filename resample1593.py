@@ -0,0 +1,234 @@
+import numpy as np
+from geometry1593 import LEDGeometry, load_geometry
+
+
+# Resampling methods
+NEAREST = 'nearest'
+BILINEAR = 'bilinear'
+AREA = 'area'
+RESAMPLING_METHODS = (NEAREST, BILINEAR, AREA)
+
+
+class RasterResampler:
+    """
+    Maps raster images of a fixed size onto the irregular LED layout.
+
+    The pixels that contribute to each LED and their weights are
+    worked out once from the LED centres.  They are stored as a
+    (num_leds, k) array of flat pixel indices and a matching array
+    of weights (i.e. a sparse matrix with at most k non-zeros per
+    row) so that resampling a frame only reads the pixels that are
+    actually needed: one np.take followed by a weighted sum over k.
+
+    The image is assumed to cover the whole display area, with
+    row 0 at y = 0 unless flip_y is set.
+    """
+
+    def __init__(
+        self,
+        image_shape: tuple,
+        method: str = BILINEAR,
+        geometry: LEDGeometry = None,
+        flip_y: bool = False,
+        footprint: np.ndarray = None
+    ):
+        """
+        Initialize the resampler.
+
+        Args:
+            image_shape: (height, width) of the images in pixels
+            method: NEAREST (one pixel per LED), BILINEAR (four
+                pixels per LED) or AREA (average of the pixels
+                under a square footprint centred on each LED)
+            geometry: LED layout (defaults to load_geometry())
+            flip_y: If True, row 0 of the image is at the top of
+                the display (y = geometry.height)
+            footprint: Side length of the square footprint of each
+                LED (mm) used by the AREA method.  May be a scalar
+                or an array with one value per LED.  Defaults to the
+                distance to each LED's nearest neighbour.
+
+        The cost of resampling a frame is proportional to the number
+        of pixels per LED, so AREA is intended for images that have
+        already been scaled down to roughly the LED spacing (a few
+        hundred pixels across).  NEAREST and BILINEAR cost the same
+        at any resolution.
+        """
+        if method not in RESAMPLING_METHODS:
+            raise ValueError(f"invalid method: {method!r}")
+        if geometry is None:
+            geometry = load_geometry()
+        self.image_shape = tuple(image_shape[:2])
+        self.method = method
+        self.num_leds = geometry.num_leds
+
+        rows, cols = self.image_shape
+        # LED positions in continuous pixel co-ordinates (pixel (r, c)
+        # covers [c, c + 1) x [r, r + 1))
+        u = geometry.x * (cols / geometry.width)
+        v = geometry.y * (rows / geometry.height)
+        if flip_y:
+            v = rows - v
+
+        if method == NEAREST:
+            c = np.clip(np.floor(u).astype(np.intp), 0, cols - 1)
+            r = np.clip(np.floor(v).astype(np.intp), 0, rows - 1)
+            self.index = (r * cols + c)[:, None]
+            self.weights = np.ones((self.num_leds, 1), dtype=np.float32)
+        elif method == BILINEAR:
+            c, wc = self.bilinear_weights(u, cols)
+            r, wr = self.bilinear_weights(v, rows)
+            self.index = (r[:, :, None] * cols + c[:, None, :])\
+                .reshape(self.num_leds, 4)
+            self.weights = (wr[:, :, None] * wc[:, None, :])\
+                .reshape(self.num_leds, 4).astype(np.float32)
+        else:
+            if footprint is None:
+                footprint = geometry.nearest_neighbour_distances[:, 0]
+            half_size = np.broadcast_to(
+                np.asarray(footprint, dtype=np.float64) / 2, (self.num_leds,)
+            )
+            c, wc = self.area_weights(
+                u, half_size * (cols / geometry.width), cols
+            )
+            r, wr = self.area_weights(
+                v, half_size * (rows / geometry.height), rows
+            )
+            k = c.shape[1] * r.shape[1]
+            self.index = (r[:, :, None] * cols + c[:, None, :])\
+                .reshape(self.num_leds, k)
+            weights = (wr[:, :, None] * wc[:, None, :])\
+                .reshape(self.num_leds, k)
+            weights /= weights.sum(axis=1, keepdims=True)
+            self.weights = weights.astype(np.float32)
+
+        self.index = np.ascontiguousarray(self.index, dtype=np.intp)
+
+    @staticmethod
+    def bilinear_weights(u: np.ndarray, n: int) -> tuple:
+        """
+        Indices and weights of the two pixels either side of each
+        position along one image axis.
+
+        Args:
+            u: Positions in continuous pixel co-ordinates
+            n: Number of pixels along the axis
+
+        Returns:
+            Tuple of (len(u), 2) arrays (indices, weights)
+        """
+        t = np.clip(u - 0.5, 0, n - 1)
+        i0 = np.minimum(np.floor(t).astype(np.intp), max(n - 2, 0))
+        i1 = np.minimum(i0 + 1, n - 1)
+        f = t - i0
+        return np.stack([i0, i1], axis=1), np.stack([1 - f, f], axis=1)
+
+    @staticmethod
+    def area_weights(u: np.ndarray, h: np.ndarray, n: int) -> tuple:
+        """
+        Indices and weights of the pixels overlapped by the interval
+        [u - h, u + h] along one image axis.  Weights are the length
+        of overlap with each pixel.  Unused entries have zero weight.
+
+        Args:
+            u: Positions in continuous pixel co-ordinates
+            h: Half-widths of the intervals (pixels)
+            n: Number of pixels along the axis
+
+        Returns:
+            Tuple of (len(u), k) arrays (indices, weights)
+        """
+        lo = np.clip(u - h, 0, n)
+        hi = np.clip(u + h, 0, n)
+        first = np.minimum(np.floor(lo).astype(np.intp), n - 1)
+        last = np.maximum(np.ceil(hi).astype(np.intp), first + 1)
+        k = int((last - first).max())
+        i = first[:, None] + np.arange(k)
+        w = np.clip(
+            np.minimum(i + 1, hi[:, None]) - np.maximum(i, lo[:, None]), 0, None
+        )
+        # Degenerate (zero-length) intervals take the whole pixel
+        w[lo == hi, 0] = 1.0
+        return np.minimum(i, n - 1), w
+
+    def resample(self, image: np.ndarray, out: np.ndarray = None) -> np.ndarray:
+        """
+        Resample one image onto the LEDs.
+
+        Args:
+            image: Numpy array with shape (height, width, channels)
+                or (height, width)
+            out: Optional uint8 array with shape (num_leds, channels)
+                to write the result to
+
+        Returns:
+            uint8 array of LED values with shape (num_leds, channels)
+            (or (num_leds,) for single-channel images)
+        """
+        if image.shape[:2] != self.image_shape:
+            raise ValueError(
+                f"image has wrong dimensions: {image.shape[:2]}, expected "
+                f"{self.image_shape}"
+            )
+        pixels = image.reshape(self.image_shape[0] * self.image_shape[1], -1)
+        if out is None:
+            out = np.empty((self.num_leds,) + image.shape[2:], dtype=np.uint8)
+        if self.method == NEAREST:
+            np.take(pixels, self.index[:, 0], axis=0,
+                    out=out.reshape(self.num_leds, -1))
+            return out
+        samples = np.take(pixels, self.index, axis=0)
+        values = np.einsum('nk,nkc->nc', self.weights, samples)
+        np.clip(np.rint(values, out=values), 0, 255, out=values)
+        out.reshape(self.num_leds, -1)[:] = values
+        return out
+
+    def resample_video(self, video: np.ndarray) -> np.ndarray:
+        """
+        Resample a sequence of images, e.g. for Display1593.play_video.
+
+        Args:
+            video: Numpy array with shape (frames, height, width,
+                channels)
+
+        Returns:
+            uint8 array with shape (frames, num_leds, channels)
+        """
+        out = np.empty((video.shape[0], self.num_leds) + video.shape[3:],
+                       dtype=np.uint8)
+        for i in range(video.shape[0]):
+            self.resample(video[i], out=out[i])
+        return out
+
+    def to_sparse(self):
+        """
+        Return the resampling weights as a scipy.sparse CSR matrix
+        with shape (num_leds, height * width).
+        """
+        from scipy.sparse import csr_matrix
+        k = self.index.shape[1]
+        matrix = csr_matrix(
+            (self.weights.ravel(), self.index.ravel(),
+             np.arange(0, self.num_leds * k + 1, k)),
+            shape=(self.num_leds, self.image_shape[0] * self.image_shape[1])
+        )
+        matrix.sum_duplicates()
+        matrix.eliminate_zeros()
+        return matrix
+
+
+# Example usage
+if __name__ == "__main__":
+    import time
+
+    image = np.random.randint(0, 256, size=(1080, 1920, 3), dtype=np.uint8)
+    for method in RESAMPLING_METHODS:
+        resampler = RasterResampler(image.shape, method=method)
+        leds = resampler.resample(image)
+        n_repeats = 100
+        t0 = time.perf_counter()
+        for _ in range(n_repeats):
+            resampler.resample(image, out=leds)
+        t = (time.perf_counter() - t0) / n_repeats
+        print(f"{method}: {t * 1000:.3f} ms per 1080p frame "
+              f"({resampler.index.shape[1]} pixels per LED)")
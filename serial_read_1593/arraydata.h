@@ -26,8 +26,6 @@ unsigned colourSet[8] PROGMEM =
 };
 
 
-/* 
-
 // Set of non-linear intensity levels for red, green,
 // and blue designed to account for the non-linear
 // relationship between RGB levels and actual light
@@ -57,8 +55,6 @@ unsigned colourScaleB[INTLEVELS] PROGMEM =
     0x00003c, 0x000041, 0x000046, 0x00004b, 0x000050, 0x000055, 0x00005a, 0x000060
 };
 
-*/
-
 //Gamma Correction Curve
 uint8_t const exp_gamma[256] PROGMEM =
 {0,0,0,0,0,0,0,0,0,0,0,0,1,1,1,1,1,1,1,1,1,1,1,1,1,1,1,1,1,1,1,2,2,2,2,2,2,2,2,2,3,3,3,3,3,
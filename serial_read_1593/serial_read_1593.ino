@@ -231,10 +231,18 @@ void setup() {
 unsigned short ledNum;
 char colR, colG, colB;
 unsigned int col;
+unsigned int r5, g6, b5;
 unsigned short i, n;
 const unsigned short *p;
 char busy = 0, command = 0;
 
+// Colour palette received with the 'P' command
+unsigned short paletteSize = 0;
+unsigned int palette[255];
+unsigned char paletteBytes[255*3];
+const unsigned short colourArraySize = sizeof(colourArray)
+                                       / sizeof(colourArray[0]);
+
 #ifdef TEENSY1
 unsigned int bness = analogRead(PHOTORES);
 #endif
@@ -258,8 +266,16 @@ void loop() {
     // 'ID' - Send identification message in response
     // 'S' - Set the colour of one LED
     // 'T' - Set the colour of one LED - using teensy led number
-    // 'N' - Update a batch of n LED colours
-    // 'A' - Update all LED colours
+    // 'N' - Update a batch of n LED colours (replies 'A' when done)
+    // 'A' - Update all LED colours (replies 'A' when done)
+    // 'L' - Update all LED colours from run-length encoded data
+    //       (replies 'A' when done)
+    // 'P' - Update all LED colours from palette indices (replies
+    //       'A' when done)
+    // 'H' - Update all LED colours from 16-bit RGB565 values
+    //       (replies 'A' when done)
+    // 'F' - Update all LED colours from 15-bit intensity levels
+    //       (replies 'A' when done)
     // 'G' - Get the colour of an LED and return it
     // 'CLS' - Clear screen (to black)
     // 'B' - Send the brightness reading according to photoresistor
@@ -296,8 +312,10 @@ void loop() {
           colB = int(Serial.read());
           leds.setPixel(*p, colR, colG, colB);
           i++, p++;
-          if(i == numLeds)
+          if(i == numLeds) {
             busy = 0;
+            Serial.write('A');  // Acknowledge complete frame
+          }
         }
         else {
           i = 0;
@@ -306,6 +324,127 @@ void loop() {
         }
         break;
 
+      // Update all LED values (on this Teensy) from
+      // run-length encoded data if the character 'L' was
+      // sent.  Each run is a count (1-255) followed by the
+      // colour of that many consecutive LEDs
+      case 'L':
+        if(busy) {
+          // Wait until the whole run (4 bytes) has arrived
+          if(Serial.available() < 4)
+            break;
+          n = Serial.read();
+          colR = int(Serial.read());
+          colG = int(Serial.read());
+          colB = int(Serial.read());
+          while((n > 0) && (i < numLeds)) {
+            leds.setPixel(*p, colR, colG, colB);
+            i++, p++, n--;
+          }
+          if(i == numLeds) {
+            busy = 0;
+            Serial.write('A');  // Acknowledge complete frame
+          }
+        }
+        else {
+          i = 0;
+          p = lookupTable;
+          busy = 'L';
+        }
+        break;
+
+      // Update all LED values (on this Teensy) from palette
+      // indices if the character 'P' was sent.  The palette
+      // size k and k colours are followed by one index per
+      // LED.  If k is 0 the built-in palette is used
+      // (colourSet followed by colourArray)
+      case 'P':
+        if(busy) {
+          // Indices outside the palette are shown as black (n is
+          // unsigned so -1 from Serial.read() is out of range too)
+          n = Serial.read();
+          if(paletteSize > 0)
+            col = (n < paletteSize) ? palette[n] : 0;
+          else if(n < 8)
+            col = colourSet[n];
+          else
+            col = (n - 8 < colourArraySize) ? colourArray[n - 8] : 0;
+          leds.setPixel(*p, col);
+          i++, p++;
+          if(i == numLeds) {
+            busy = 0;
+            Serial.write('A');  // Acknowledge complete frame
+          }
+        }
+        else {
+          // Palette size (one byte, 0-255) and colours.  If they
+          // don't all arrive before readBytes times out the
+          // command is ignored (no 'A' is sent) and the palette
+          // is unchanged
+          unsigned char k;
+          if(Serial.readBytes((char *)&k, 1) != 1)
+            break;
+          if(Serial.readBytes((char *)paletteBytes, k*3) != (size_t)(k*3))
+            break;
+          paletteSize = k;
+          for(i = 0; i < paletteSize; i++)
+            palette[i] = (paletteBytes[i*3] << 16)
+                         | (paletteBytes[i*3 + 1] << 8)
+                         | paletteBytes[i*3 + 2];
+          i = 0;
+          p = lookupTable;
+          busy = 'P';
+        }
+        break;
+
+      // Update all LED values (on this Teensy) from 16-bit
+      // RGB565 values if the character 'H' was sent
+      case 'H':
+        if(busy) {
+          col = Serial.read() << 8;
+          col |= Serial.read();
+          r5 = (col >> 11) & 0x1f;
+          g6 = (col >> 5) & 0x3f;
+          b5 = col & 0x1f;
+          leds.setPixel(*p, (r5 << 3) | (r5 >> 2), (g6 << 2) | (g6 >> 4),
+                        (b5 << 3) | (b5 >> 2));
+          i++, p++;
+          if(i == numLeds) {
+            busy = 0;
+            Serial.write('A');  // Acknowledge complete frame
+          }
+        }
+        else {
+          i = 0;
+          p = lookupTable;
+          busy = 'H';
+        }
+        break;
+
+      // Update all LED values (on this Teensy) from 15-bit
+      // values (5-bit intensity level of each colour, 0 to
+      // INTLEVELS - 1) if the character 'F' was sent.  The
+      // levels are converted with the colourScale tables
+      case 'F':
+        if(busy) {
+          col = Serial.read() << 8;
+          col |= Serial.read();
+          leds.setPixel(*p, colourScaleR[(col >> 10) & 0x1f]
+                            | colourScaleG[(col >> 5) & 0x1f]
+                            | colourScaleB[col & 0x1f]);
+          i++, p++;
+          if(i == numLeds) {
+            busy = 0;
+            Serial.write('A');  // Acknowledge complete frame
+          }
+        }
+        else {
+          i = 0;
+          p = lookupTable;
+          busy = 'F';
+        }
+        break;
+
       // Update a batch of n LED values if the 
       // character 'N' was sent
       case 'N':
@@ -315,15 +454,19 @@ void loop() {
           colG = int(Serial.read());
           colB = int(Serial.read());
           leds.setPixel(ledNum, colR, colG, colB);
-          if(i < n)
-            i++;
-          else
+          i++;
+          if(i == n) {
             busy = 0;
+            Serial.write('A');  // Acknowledge complete batch
+          }
         }
         else {
           n = int((Serial.read() << 8) + Serial.read());
           i = 0;
-          busy = 'N';
+          if(n > 0)
+            busy = 'N';
+          else
+            Serial.write('A');  // Empty batch (nothing changed)
         }
         break;
 
@@ -1,4 +1,8 @@
+import asyncio
+import os
 import serial
+import select
+import selectors
 import time
 from serial import SerialException
 
@@ -7,6 +11,10 @@ DEFAULT_BAUD_RATE = 921600
 CONNECTION_REQUEST = ord('C')
 CONNECTION_REQUEST_RESPONSE = ord('R')
 
+# Polling interval used on platforms where serial ports cannot be
+# waited on with select (i.e. Windows)
+POLL_INTERVAL = 0.001
+
 
 def open_serial_connections(ports, baud_rate=DEFAULT_BAUD_RATE):
     serial_conns = {}
@@ -21,14 +29,86 @@ def open_serial_connections(ports, baud_rate=DEFAULT_BAUD_RATE):
     return serial_conns
 
 
+def serial_fileno(ser):
+    """Returns the file descriptor of a serial connection or None
+    if it cannot be used with select (e.g. on Windows)."""
+    try:
+        return ser.fileno()
+    except (AttributeError, OSError, SerialException):
+        return None
+
+
 def wait_for_serial_input(ser, timeout=5.0):
-    t = time.time()
-    while ser.in_waiting == 0:
-        if time.time() - t > timeout:
-            return 1, "timeout"
+    """Block until there is data waiting to be read from ser.
+
+    Uses select so the calling thread sleeps (using no CPU) until
+    data arrives.
+    """
+    if ser.in_waiting > 0:
+        return 0, ""
+    fd = serial_fileno(ser)
+    if fd is None:
+        t = time.monotonic()
+        while ser.in_waiting == 0:
+            if time.monotonic() - t > timeout:
+                return 1, "timeout"
+            time.sleep(POLL_INTERVAL)
+        return 0, ""
+    readable, _, _ = select.select([fd], [], [], max(0.0, timeout))
+    if not readable:
+        return 1, "timeout"
     return 0, ""
 
 
+def read_serial(ser, size=1, timeout=1.0):
+    """Read size bytes from ser, blocking until they have all
+    arrived or the timeout expires.  Returns the bytes read (which
+    may be fewer than size if timed out).  Raises SerialException if
+    the device has been disconnected."""
+    data = bytearray()
+    deadline = time.monotonic() + timeout
+    while len(data) < size:
+        if ser.in_waiting == 0:
+            status, msg = wait_for_serial_input(
+                ser, timeout=deadline - time.monotonic()
+            )
+            if status == 1:
+                break
+            # The port is readable but there is no data (end of file)
+            if ser.in_waiting == 0:
+                raise SerialException(
+                    "device reports readiness to read but returned no "
+                    "data (device disconnected?)"
+                )
+        data += ser.read(min(ser.in_waiting, size - len(data)))
+    return bytes(data)
+
+
+def write_serial(ser, data, timeout=None):
+    """Write all of data (any bytes-like object) to ser.
+
+    Unlike ser.write, the data is written straight from the caller's
+    buffer without making a copy of it first.  Returns the number of
+    bytes written.
+    """
+    fd = serial_fileno(ser)
+    if fd is None:
+        return ser.write(data)
+    view = memoryview(data).cast('B')
+    length = len(view)
+    while len(view) > 0:
+        try:
+            n = os.write(fd, view)
+        except BlockingIOError:
+            n = 0
+        if n == 0:
+            _, writable, _ = select.select([], [fd], [], timeout)
+            if not writable:
+                raise serial.SerialTimeoutException('Write timeout')
+        view = view[n:]
+    return length
+
+
 def establish_communication(
     ser,
     conn_code=CONNECTION_REQUEST,
@@ -42,19 +122,187 @@ def establish_communication(
     b = int.from_bytes(ser.read())
     if b == conn_code:
         ser.write(conn_code.to_bytes())
-        status, msg = wait_for_serial_input(ser, timeout=timeout)
-        if status == 1:
+        response = read_serial(ser, 2, timeout=timeout)
+        if len(response) < 2:
             return 2, None, "gave up waiting for response to connection request"
-        c, device_id = ser.read(2)
-        if c != CONNECTION_REQUEST_RESPONSE:
+        c, device_id = response
+        if c != conn_response_code:
             return 3, None, "incorrect response to connection request"
         return 0, device_id, ""
     return 2, None, "device sending data but not requesting new connection"
 
 
-def serial_monitor(serial_conns):
-    while True:
+class AsyncSerial:
+    """Non-blocking access to a serial connection from asyncio.
+
+    Reads and writes go straight to the connection's file descriptor
+    and wait for it to become readable/writable using the event loop,
+    so many connections can be serviced by one thread.  Requires
+    serial ports that support fileno() (i.e. not Windows).
+    """
+
+    def __init__(self, ser):
+        self.ser = ser
+        self.fd = serial_fileno(ser)
+        if self.fd is None:
+            raise SerialException("serial connection does not support select")
+        os.set_blocking(self.fd, False)
+
+    async def wait_readable(self):
+        await self._wait(True)
+
+    async def wait_writable(self):
+        await self._wait(False)
+
+    async def _wait(self, read):
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+
+        def ready():
+            if not future.done():
+                future.set_result(None)
+
+        if read:
+            loop.add_reader(self.fd, ready)
+        else:
+            loop.add_writer(self.fd, ready)
+        try:
+            await future
+        finally:
+            if read:
+                loop.remove_reader(self.fd)
+            else:
+                loop.remove_writer(self.fd)
+
+    async def read(self, size=1, timeout=None):
+        """Read size bytes.  Returns the bytes read (which may be
+        fewer than size if timed out).  Raises SerialException if the
+        device has been disconnected."""
+        data = bytearray()
+        try:
+            async with asyncio.timeout(timeout):
+                while len(data) < size:
+                    try:
+                        chunk = os.read(self.fd, size - len(data))
+                    except BlockingIOError:
+                        await self.wait_readable()
+                        continue
+                    if not chunk:
+                        # Readable but end of file
+                        raise SerialException(
+                            "device reports readiness to read but "
+                            "returned no data (device disconnected?)"
+                        )
+                    data += chunk
+        except TimeoutError:
+            pass
+        return bytes(data)
+
+    async def write(self, data):
+        """Write all of data to the serial connection."""
+        view = memoryview(data).cast('B')
+        while len(view) > 0:
+            try:
+                n = os.write(self.fd, view)
+            except BlockingIOError:
+                n = 0
+            if n == 0:
+                await self.wait_writable()
+            view = view[n:]
+
+    def reset_input_buffer(self):
+        self.ser.reset_input_buffer()
+
+    def close(self):
+        self.ser.close()
+
+
+async def async_establish_communication(
+    aser,
+    conn_code=CONNECTION_REQUEST,
+    conn_response_code=CONNECTION_REQUEST_RESPONSE,
+    timeout=5.0
+):
+    """Asyncio version of establish_communication, for use with an
+    AsyncSerial connection."""
+    aser.reset_input_buffer()
+    data = await aser.read(1, timeout=timeout)
+    if len(data) == 0:
+        return 1, None, "gave up waiting for device to send data"
+    if data[0] == conn_code:
+        await aser.write(conn_code.to_bytes())
+        response = await aser.read(2, timeout=timeout)
+        if len(response) < 2:
+            return 2, None, "gave up waiting for response to connection request"
+        c, device_id = response
+        if c != conn_response_code:
+            return 3, None, "incorrect response to connection request"
+        return 0, device_id, ""
+    return 2, None, "device sending data but not requesting new connection"
+
+
+class SerialReader:
+    """Waits for data on several serial connections at once and
+    passes whatever arrives to a callback function.
+
+    Uses a selector so no CPU is used while the connections are
+    idle.  Requires serial ports that support fileno() (i.e. not
+    Windows).
+    """
+
+    def __init__(self, serial_conns, callback):
+        """Initialize the reader.
+
+        Args:
+            serial_conns: Dictionary of serial connections
+            callback: Function called as callback(i, data) with the
+                key of the connection and the bytes received
+        """
+        self.callback = callback
+        self.selector = selectors.DefaultSelector()
         for i, ser in serial_conns.items():
-            if ser.in_waiting > 0:
-                b = int.from_bytes(ser.read())
-                print(f"{i}: {chr(b)}")
+            fd = serial_fileno(ser)
+            if fd is None:
+                raise SerialException(
+                    f"serial connection {i} does not support select"
+                )
+            self.selector.register(fd, selectors.EVENT_READ, (i, ser))
+        self.running = False
+
+    def poll(self, timeout=None):
+        """Wait up to timeout seconds for data on any connection and
+        pass it to the callback.  Returns the number of bytes read."""
+        n_bytes = 0
+        for key, events in self.selector.select(timeout):
+            i, ser = key.data
+            data = ser.read(max(ser.in_waiting, 1))
+            n_bytes += len(data)
+            if data:
+                self.callback(i, data)
+        return n_bytes
+
+    def run(self, timeout=0.5):
+        """Keep reading until stop() is called.  timeout sets how
+        often the stop flag is checked."""
+        self.running = True
+        while self.running:
+            self.poll(timeout)
+
+    def stop(self):
+        self.running = False
+
+    def close(self):
+        self.selector.close()
+
+
+def serial_monitor(serial_conns):
+
+    def print_data(i, data):
+        for b in data:
+            print(f"{i}: {chr(b)}")
+
+    reader = SerialReader(serial_conns, print_data)
+    try:
+        reader.run()
+    finally:
+        reader.close()
@@ -0,0 +1,300 @@
+import functools
+import numpy as np
+from geometry1593 import LEDGeometry, load_geometry
+
+try:
+    from scipy.spatial import cKDTree
+except ImportError:
+    cKDTree = None
+
+
+class GridIndex:
+    """
+    Uniform grid of buckets of points.
+
+    Used in place of scipy.spatial.cKDTree when SciPy is not
+    installed.  Points are sorted by bucket so that the points in
+    each bucket are a contiguous slice of self.order.
+    """
+
+    def __init__(self, points: np.ndarray, cell_size: float):
+        """
+        Args:
+            points: (n, 2) array of point co-ordinates
+            cell_size: Side length of the grid buckets
+        """
+        self.points = np.asarray(points, dtype=np.float64)
+        self.cell_size = float(cell_size)
+        self.origin = self.points.min(axis=0)
+        cells = np.floor((self.points - self.origin) / self.cell_size)\
+            .astype(np.intp)
+        self.shape = tuple(cells.max(axis=0) + 1)
+        cell_ids = cells[:, 0] * self.shape[1] + cells[:, 1]
+        self.order = np.argsort(cell_ids, kind='stable')
+        self.cell_start = np.zeros(self.shape[0] * self.shape[1] + 1,
+                                   dtype=np.intp)
+        np.cumsum(np.bincount(cell_ids, minlength=self.shape[0] *
+                              self.shape[1]), out=self.cell_start[1:])
+
+    def candidates(self, x: float, y: float, r: float) -> np.ndarray:
+        """Indices of all points in buckets within r of (x, y)."""
+        lo = np.floor((np.array([x, y]) - r - self.origin) / self.cell_size)
+        hi = np.floor((np.array([x, y]) + r - self.origin) / self.cell_size)
+        i0, j0 = np.maximum(lo, 0).astype(np.intp)
+        i1, j1 = np.minimum(hi, np.array(self.shape) - 1).astype(np.intp)
+        if i1 < i0 or j1 < j0:
+            return np.empty(0, dtype=np.intp)
+        slices = [
+            self.order[self.cell_start[i * self.shape[1] + j0]:
+                       self.cell_start[i * self.shape[1] + j1 + 1]]
+            for i in range(i0, i1 + 1)
+        ]
+        return np.concatenate(slices)
+
+    def query_ball_point(self, x: float, y: float, r: float) -> np.ndarray:
+        """Indices of points within distance r of (x, y)."""
+        idx = self.candidates(x, y, r)
+        d2 = ((self.points[idx] - (x, y)) ** 2).sum(axis=1)
+        return idx[d2 <= r * r]
+
+    def query_ball_points(self, points: np.ndarray, r: np.ndarray) -> tuple:
+        """
+        Points within distance r of each of several points.
+
+        Args:
+            points: (m, 2) array of co-ordinates
+            r: Array of m radii
+
+        Returns:
+            Tuple (point_ids, idx) of arrays listing the pairs of
+            query point and point index found, grouped by query point
+        """
+        m = points.shape[0]
+        lo = np.floor((points - r[:, None] - self.origin) / self.cell_size)
+        hi = np.floor((points + r[:, None] - self.origin) / self.cell_size)
+        lo = np.maximum(lo, 0).astype(np.intp)
+        hi = np.minimum(hi, np.array(self.shape) - 1).astype(np.intp)
+        num_rows = np.maximum(hi[:, 0] - lo[:, 0] + 1, 0)
+        num_rows[hi[:, 1] < lo[:, 1]] = 0
+
+        # One contiguous slice of self.order per (point, bucket row)
+        row_points = np.repeat(np.arange(m), num_rows)
+        rows = lo[row_points, 0] + np.arange(num_rows.sum()) - np.repeat(
+            np.cumsum(num_rows) - num_rows, num_rows
+        )
+        starts = self.cell_start[rows * self.shape[1] + lo[row_points, 1]]
+        stops = self.cell_start[rows * self.shape[1] + hi[row_points, 1] + 1]
+        lengths = stops - starts
+        point_ids = np.repeat(row_points, lengths)
+        idx = self.order[
+            np.repeat(starts, lengths) + np.arange(lengths.sum())
+            - np.repeat(np.cumsum(lengths) - lengths, lengths)
+        ]
+        d2 = ((self.points[idx] - points[point_ids]) ** 2).sum(axis=1)
+        inside = d2 <= r[point_ids] ** 2
+        return point_ids[inside], idx[inside]
+
+    def query(self, x: float, y: float, k: int) -> tuple:
+        """Distances and indices of the k nearest points to (x, y)."""
+        k = min(k, self.points.shape[0])
+        r = self.cell_size
+        while True:
+            idx = self.candidates(x, y, r)
+            d = np.hypot(*(self.points[idx] - (x, y)).T)
+            inside = d <= r
+            if np.count_nonzero(inside) >= k:
+                break
+            r *= 2
+        nearest = np.argsort(d, kind='stable')[:k]
+        return d[nearest], idx[nearest]
+
+
+class LEDSpatialIndex:
+    """
+    Spatial index of the LED centres for point and region queries.
+
+    Uses scipy.spatial.cKDTree if SciPy is installed, otherwise a
+    uniform grid of buckets.  Results of radius and polygon queries
+    are cached, so repeated queries with the same shape (e.g. a
+    spotlight that stays still for several frames) are free.
+    """
+
+    def __init__(
+        self,
+        geometry: LEDGeometry = None,
+        use_scipy: bool = None,
+        cell_size: float = None,
+        cache_size: int = 1024
+    ):
+        """
+        Initialize the spatial index.
+
+        Args:
+            geometry: LED layout (defaults to load_geometry())
+            use_scipy: Whether to use cKDTree (defaults to True if
+                SciPy is installed)
+            cell_size: Size of the grid buckets if a grid is used
+                (defaults to the mean nearest neighbour distance)
+            cache_size: Maximum number of query results to cache
+        """
+        if geometry is None:
+            geometry = load_geometry()
+        if use_scipy is None:
+            use_scipy = cKDTree is not None
+        elif use_scipy and cKDTree is None:
+            raise ValueError("scipy is not installed")
+        self.centres = geometry.centres
+        self.num_leds = geometry.num_leds
+        if use_scipy:
+            self.tree = cKDTree(self.centres)
+            self.grid = None
+        else:
+            if cell_size is None:
+                cell_size = geometry.nearest_neighbour_distances[:, 0].mean()
+            self.tree = None
+            self.grid = GridIndex(self.centres, cell_size)
+        self.cached_radius_query = functools.lru_cache(maxsize=cache_size)(
+            self.radius_query
+        )
+        self.cached_polygon_query = functools.lru_cache(maxsize=cache_size)(
+            self.polygon_query
+        )
+
+    def radius_query(self, x: float, y: float, r: float) -> np.ndarray:
+        """Sorted indices of the LEDs within distance r of (x, y)."""
+        if self.tree is not None:
+            idx = np.array(self.tree.query_ball_point((x, y), r),
+                           dtype=np.intp)
+        else:
+            idx = self.grid.query_ball_point(x, y, r)
+        idx.sort()
+        idx.flags.writeable = False  # Shared by the cache
+        return idx
+
+    def query_radius(self, points, r) -> list:
+        """
+        Find the LEDs within a distance of one or more points.
+
+        Args:
+            points: (x, y) co-ordinates or an (m, 2) array of them
+            r: Radius, or an array of m radii (mm)
+
+        Returns:
+            Sorted array of LED numbers, or a list of m arrays if
+            several points were given.  The arrays are read-only.
+
+        Only single point queries are cached.  Several points are
+        looked up together in one query.
+        """
+        points = np.asarray(points, dtype=np.float64)
+        if points.ndim == 1:
+            return self.cached_radius_query(
+                float(points[0]), float(points[1]), float(r)
+            )
+        radii = np.broadcast_to(np.asarray(r, dtype=np.float64),
+                                points.shape[:1])
+        if self.tree is not None:
+            results = [
+                np.array(idx, dtype=np.intp)
+                for idx in self.tree.query_ball_point(points, radii)
+            ]
+        else:
+            point_ids, idx = self.grid.query_ball_points(points, radii)
+            results = np.split(
+                idx, np.cumsum(np.bincount(point_ids,
+                                           minlength=len(points)))[:-1]
+            )
+        for idx in results:
+            idx.sort()
+            idx.flags.writeable = False
+        return results
+
+    def query_knn(self, points, k: int = 1) -> tuple:
+        """
+        Find the k nearest LEDs to one or more points.
+
+        Args:
+            points: (x, y) co-ordinates or an (m, 2) array of them
+            k: Number of LEDs to find
+
+        Returns:
+            Tuple (distances, indices) of arrays with shape (k,), or
+            (m, k) if several points were given.  Nearest first.
+        """
+        points = np.asarray(points, dtype=np.float64)
+        single = points.ndim == 1
+        points = np.atleast_2d(points)
+        k = min(k, self.num_leds)
+        if self.tree is not None:
+            distances, indices = self.tree.query(points, k=k)
+            distances = distances.reshape(-1, k)
+            indices = indices.reshape(-1, k).astype(np.intp)
+        else:
+            distances = np.empty((points.shape[0], k))
+            indices = np.empty((points.shape[0], k), dtype=np.intp)
+            for i, (x, y) in enumerate(points):
+                distances[i], indices[i] = self.grid.query(x, y, k)
+        if single:
+            return distances[0], indices[0]
+        return distances, indices
+
+    def polygon_query(self, vertices: tuple) -> np.ndarray:
+        """Sorted indices of the LEDs inside a polygon (given as a
+        tuple of (x, y) tuples)."""
+        poly = np.array(vertices, dtype=np.float64)
+        lo, hi = poly.min(axis=0), poly.max(axis=0)
+        # Candidates are the LEDs within the bounding circle
+        centre = (lo + hi) / 2
+        radius = np.hypot(*(hi - centre))
+        if self.tree is not None:
+            idx = np.array(self.tree.query_ball_point(centre, radius),
+                           dtype=np.intp)
+        else:
+            idx = self.grid.candidates(*centre, radius)
+        idx = idx[np.all((self.centres[idx] >= lo) &
+                         (self.centres[idx] <= hi), axis=1)]
+        idx = idx[points_in_polygon(self.centres[idx], poly)]
+        idx.sort()
+        idx.flags.writeable = False  # Shared by the cache
+        return idx
+
+    def query_polygon(self, vertices) -> np.ndarray:
+        """
+        Find the LEDs inside a polygon.
+
+        Args:
+            vertices: Sequence of (x, y) co-ordinates of the polygon
+                vertices (mm)
+
+        Returns:
+            Sorted read-only array of LED numbers
+        """
+        return self.cached_polygon_query(
+            tuple((float(x), float(y)) for x, y in vertices)
+        )
+
+    def clear_cache(self):
+        """Discard all cached query results."""
+        self.cached_radius_query.cache_clear()
+        self.cached_polygon_query.cache_clear()
+
+
+def points_in_polygon(points: np.ndarray, poly: np.ndarray) -> np.ndarray:
+    """
+    Even-odd rule point-in-polygon test (ray casting), vectorized
+    over points and polygon edges.
+
+    Args:
+        points: (n, 2) array of point co-ordinates
+        poly: (m, 2) array of polygon vertices
+
+    Returns:
+        Boolean array of length n
+    """
+    x, y = points[:, 0:1], points[:, 1:2]
+    x0, y0 = poly[:, 0], poly[:, 1]
+    x1, y1 = np.roll(x0, -1), np.roll(y0, -1)
+    crosses = (y0 > y) != (y1 > y)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        x_cross = x0 + (y - y0) * (x1 - x0) / (y1 - y0)
+    return np.count_nonzero(crosses & (x < x_cross), axis=1) % 2 == 1
@@ -0,0 +1,28 @@
+import numpy as np
+from colour1593 import ColourPipeline, LINEAR, TYPICAL_LED_STRIP
+
+
+def test_linear_pipeline_is_identity():
+    frame = np.random.default_rng(0).integers(
+        0, 256, size=(100, 3), dtype=np.uint8
+    )
+    assert np.array_equal(ColourPipeline(gamma=LINEAR).apply(frame), frame)
+
+
+def test_brightness_and_correction_scale_full_white():
+    pipeline = ColourPipeline(gamma=LINEAR, correction=TYPICAL_LED_STRIP)
+    pipeline.set_brightness(0.5)
+    out = pipeline.apply(np.full((1, 3), 255, dtype=np.uint8))
+    expected = np.rint(np.array(TYPICAL_LED_STRIP) * 0.5)
+    assert np.array_equal(out[0], expected)
+
+    pipeline.set_brightness(2.0)  # Clipped to 1
+    assert pipeline.brightness == 1.0
+
+
+def test_dithering_averages_to_fractional_level():
+    pipeline = ColourPipeline(gamma=LINEAR, brightness=0.25, dither=True)
+    frame = np.full((500, 3), 10, dtype=np.uint8)  # 2.5 after scaling
+    frames = [pipeline.apply(frame) for _ in range(256)]
+    assert np.isin(frames, [2, 3]).all()
+    assert abs(np.mean(frames) - 2.5) < 0.01
@@ -0,0 +1,45 @@
+import numpy as np
+from geometry1593 import load_geometry
+from effects1593 import NeighbourEffects
+
+
+def test_impulse_on_edge_does_not_wrap_to_opposite_edge():
+    geometry = load_geometry()
+    effects = NeighbourEffects(geometry)
+    x = geometry.x
+    left = np.argmin(x)
+    right_edge = x > geometry.width * 0.75
+
+    state = np.zeros(geometry.num_leds)
+    state[left] = 1.0
+    u = state.copy()
+    u_prev = np.zeros(geometry.num_leds)
+    for _ in range(10):
+        effects.diffuse(state, out=state)
+        u, u_prev = effects.wave_step(u, u_prev), u
+    assert state[right_edge].max() == 0.0
+    assert np.abs(u[right_edge]).max() == 0.0
+
+    steps = effects.flood_fill([left], max_steps=10)
+    assert np.all(steps[right_edge] == -1)
+
+
+def test_wrap_option_keeps_periodic_neighbours():
+    geometry = load_geometry()
+    x = geometry.x
+    left = np.argmin(x)
+    right_edge = x > geometry.width * 0.75
+
+    steps = NeighbourEffects(geometry, wrap=True).flood_fill(
+        [left], max_steps=10
+    )
+    assert np.any(steps[right_edge] >= 0)
+
+
+def test_leds_without_valid_neighbours_have_finite_weights():
+    geometry = load_geometry()
+    effects = NeighbourEffects(geometry, num_neighbours=1)
+    assert np.all(np.isfinite(effects.weights))
+
+    state = np.random.default_rng(0).random(geometry.num_leds)
+    assert np.all(np.isfinite(effects.diffuse(state)))
@@ -0,0 +1,145 @@
+import numpy as np
+import pytest
+from display1593 import make_pixel_indices
+from frame_encoding import (
+    RawFrameEncoder, DeltaFrameEncoder, CompressedFrameEncoder,
+    ReducedDepthFrameEncoder, BUILTIN_PALETTE, RGB565, LEVELS,
+    FULL_UPDATE, BATCH_UPDATE, RUN_LENGTH_UPDATE, PALETTE_UPDATE
+)
+
+
+PIXEL_INDEX = make_pixel_indices()[49]
+NUM_LEDS = len(PIXEL_INDEX)
+
+
+def decode(packet: bytes, state: np.ndarray) -> np.ndarray:
+    # What serial_read_1593 does with each command (LEDs in segment
+    # order rather than Teensy pixel order)
+    data = np.frombuffer(bytes(packet), dtype=np.uint8)
+    command, body = data[0], data[1:]
+    state = state.copy()
+    if command == FULL_UPDATE:
+        state[:] = body.reshape(-1, 3)
+    elif command == BATCH_UPDATE:
+        n = int(body[0]) << 8 | int(body[1])
+        records = body[2:].reshape(n, 5)
+        pixels = records[:, 0].astype(int) << 8 | records[:, 1]
+        assert len(records) == n
+        leds = np.searchsorted(PIXEL_INDEX, pixels)
+        assert np.array_equal(PIXEL_INDEX[leds], pixels)
+        state[leds] = records[:, 2:]
+    elif command == RUN_LENGTH_UPDATE:
+        records = body.reshape(-1, 4)
+        assert records[:, 0].min() >= 1
+        state[:] = np.repeat(records[:, 1:], records[:, 0], axis=0)
+    elif command == PALETTE_UPDATE:
+        k = int(body[0])
+        if k == 0:
+            palette = BUILTIN_PALETTE
+        else:
+            rgb = body[1:1 + 3 * k].reshape(k, 3).astype(np.uint32)
+            palette = rgb[:, 0] << 16 | rgb[:, 1] << 8 | rgb[:, 2]
+        colours = palette[body[1 + 3 * k:]]
+        assert len(colours) == NUM_LEDS
+        state[:, 0] = colours >> 16
+        state[:, 1] = colours >> 8 & 0xff
+        state[:, 2] = colours & 0xff
+    else:
+        raise AssertionError(f"unexpected command {command}")
+    return state
+
+
+def random_frame(seed: int = 0) -> np.ndarray:
+    return np.random.default_rng(seed).integers(
+        0, 256, size=(NUM_LEDS, 3), dtype=np.uint8
+    )
+
+
+def test_raw_encoder_header_and_data():
+    encoder = RawFrameEncoder(NUM_LEDS)
+    frame = random_frame()
+    packet = bytes(encoder.encode(frame))
+    assert packet[0] == 0xAB
+    assert packet[1:] == frame.tobytes()
+
+    packet = bytes(encoder.encode(frame, seq=7))
+    assert packet[:2] == bytes([0xAC, 7])
+    assert packet[2:] == frame.tobytes()
+
+
+def test_delta_encoder_round_trip():
+    encoder = DeltaFrameEncoder(PIXEL_INDEX)
+    state = np.zeros((NUM_LEDS, 3), dtype=np.uint8)
+    frame = random_frame()
+
+    packet = encoder.encode(frame)
+    assert packet[0] == FULL_UPDATE
+    state = decode(packet, state)
+    encoder.commit()
+    assert np.array_equal(state, frame)
+
+    frame = frame.copy()
+    frame[[3, 50, 400]] = [1, 2, 3]
+    packet = encoder.encode(frame)
+    assert packet[0] == BATCH_UPDATE
+    assert len(packet) == 3 + 5 * 3
+    state = decode(packet, state)
+    encoder.commit()
+    assert np.array_equal(state, frame)
+
+
+def test_delta_encoder_sends_full_update_after_reset():
+    encoder = DeltaFrameEncoder(PIXEL_INDEX)
+    frame = random_frame()
+    encoder.encode(frame)
+    encoder.commit()
+    encoder.encode(frame)
+    encoder.reset()
+    assert encoder.encode(frame)[0] == FULL_UPDATE
+
+
+@pytest.mark.parametrize("make_frame, command", [
+    (lambda: np.zeros((NUM_LEDS, 3), dtype=np.uint8), RUN_LENGTH_UPDATE),
+    (lambda: np.repeat(random_frame()[:4], [300, 1, 300, NUM_LEDS - 601],
+                       axis=0), RUN_LENGTH_UPDATE),
+    (lambda: random_frame()[np.arange(NUM_LEDS) % 37], PALETTE_UPDATE),
+    (lambda: random_frame(), FULL_UPDATE),
+])
+def test_compressed_encoder_round_trip(make_frame, command):
+    encoder = CompressedFrameEncoder(PIXEL_INDEX)
+    frame = make_frame()
+    packet = encoder.encode(frame)
+    assert packet[0] == command
+    state = decode(packet, np.zeros((NUM_LEDS, 3), dtype=np.uint8))
+    assert np.array_equal(state, frame)
+
+
+def test_compressed_encoder_uses_builtin_palette():
+    encoder = CompressedFrameEncoder(PIXEL_INDEX)
+    colours = BUILTIN_PALETTE[np.arange(NUM_LEDS) % len(BUILTIN_PALETTE)]
+    frame = np.stack(
+        [colours >> 16, colours >> 8 & 0xff, colours & 0xff], axis=1
+    ).astype(np.uint8)
+    packet = encoder.encode(frame)
+    assert packet[:2] == bytes([PALETTE_UPDATE, 0])
+    state = decode(packet, np.zeros((NUM_LEDS, 3), dtype=np.uint8))
+    assert np.array_equal(state, frame)
+
+
+@pytest.mark.parametrize("depth_format, bits", [
+    (RGB565, (5, 6, 5)),
+    (LEVELS, (5, 5, 5)),
+])
+def test_reduced_depth_encoder_keeps_high_bits(depth_format, bits):
+    encoder = ReducedDepthFrameEncoder(NUM_LEDS, depth_format)
+    frame = random_frame()
+    packet = encoder.encode(frame)
+    assert len(packet) == 1 + 2 * NUM_LEDS
+
+    words = np.frombuffer(packet[1:], dtype='>u2')
+    position = 0
+    for c in (2, 1, 0):
+        channel = words >> position & ((1 << bits[c]) - 1)
+        assert np.array_equal(channel, frame[:, c] >> (8 - bits[c]))
+        position += bits[c]
+    assert np.all(words >> position == 0)
@@ -0,0 +1,97 @@
+import threading
+import numpy as np
+from frame_writer import FrameWriter, DROP_OLDEST, DROP_NEWEST, put_all
+
+
+def test_drop_oldest_with_one_buffer_waits_for_writer():
+    # With queue_size=1 the writer thread holds the only buffer while
+    # it is sending, so there is no queued frame to drop
+    sending = threading.Event()
+    release = threading.Event()
+    sent = []
+
+    def send(frame):
+        sent.append(frame.copy())
+        sending.set()
+        release.wait(5.0)
+        return True
+
+    writer = FrameWriter(send, (4, 3), queue_size=1, full_policy=DROP_OLDEST)
+    writer.start()
+    try:
+        assert writer.put(np.full((4, 3), 1))
+        assert sending.wait(5.0)
+
+        result = []
+        putter = threading.Thread(
+            target=lambda: result.append(writer.put(np.full((4, 3), 2)))
+        )
+        putter.start()
+        putter.join(0.1)
+        assert putter.is_alive()  # Waiting for the buffer
+
+        release.set()
+        putter.join(5.0)
+        assert result == [True]
+        assert writer.join_queue(5.0)
+    finally:
+        release.set()
+        writer.stop(5.0)
+
+    assert [frame[0, 0] for frame in sent] == [1, 2]
+    assert writer.frames_dropped == 0
+
+
+def make_writers(full_policy, release, sent):
+    # Two writers sharing a condition, stuck sending until released
+    condition = threading.Condition()
+
+    def send(frame, i):
+        sent[i].append(int(frame[0, 0]))
+        release.wait(5.0)
+        return True
+
+    return [
+        FrameWriter(lambda frame, i=i: send(frame, i), (4, 3),
+                    queue_size=2, full_policy=full_policy,
+                    condition=condition)
+        for i in range(2)
+    ]
+
+
+def check_same_frames_sent(full_policy):
+    release = threading.Event()
+    sent = [[], []]
+    writers = make_writers(full_policy, release, sent)
+    for writer in writers:
+        writer.start()
+    try:
+        results = [
+            put_all(writers, [np.full((4, 3), n)] * 2)
+            for n in range(1, 6)
+        ]
+        release.set()
+        for writer in writers:
+            assert writer.join_queue(5.0)
+    finally:
+        release.set()
+        for writer in writers:
+            writer.stop(5.0)
+
+    assert sent[0] == sent[1]
+    assert len(sent[0]) + writers[0].frames_dropped == 5
+    assert writers[0].frames_dropped == writers[1].frames_dropped
+    return results, sent[0]
+
+
+def test_put_all_drop_newest_drops_frame_on_every_writer():
+    results, sent = check_same_frames_sent(DROP_NEWEST)
+    assert sent == [n for n, queued in zip(range(1, 6), results) if queued]
+    assert not all(results)
+
+
+def test_put_all_drop_oldest_drops_frame_on_every_writer():
+    results, sent = check_same_frames_sent(DROP_OLDEST)
+    assert all(results)
+    assert sent[-1] == 5
+    assert len(sent) < 5
@@ -0,0 +1,39 @@
+import numpy as np
+import pytest
+from display1593 import LEDS_PER_STRIP
+from power1593 import PowerLimiter, SCALE_FRAME, SCALE_STRIP
+
+NUM_LEDS = sum(map(sum, LEDS_PER_STRIP.values()))
+
+
+def test_frame_within_limits_is_not_scaled():
+    limiter = PowerLimiter(LEDS_PER_STRIP, strip_limit=10.0,
+                           total_limit=100.0)
+    frame = np.full((NUM_LEDS, 3), 255, dtype=np.uint8)
+    assert limiter.limit(frame) is frame
+    assert limiter.frames_limited == 0
+
+
+@pytest.mark.parametrize("mode", [SCALE_STRIP, SCALE_FRAME])
+def test_scaled_frame_meets_limits(mode):
+    limiter = PowerLimiter(LEDS_PER_STRIP, strip_limit=2.0,
+                           total_limit=20.0, mode=mode)
+    frame = np.random.default_rng(0).integers(
+        0, 256, size=(NUM_LEDS, 3), dtype=np.uint8
+    )
+    frame[:100] = 255  # First strip well over the strip limit
+    out = limiter.limit(frame)
+    assert limiter.frames_limited == 1
+    assert np.all(out <= frame)
+    currents = limiter.estimate(out)
+    assert currents.max() <= 2.0
+    assert currents.sum() <= 20.0
+
+
+def test_scale_strip_only_dims_strips_over_limit():
+    limiter = PowerLimiter(LEDS_PER_STRIP, strip_limit=2.0)
+    frame = np.full((NUM_LEDS, 3), 10, dtype=np.uint8)
+    frame[:100] = 255
+    out = limiter.limit(frame)
+    assert np.all(out[:100] < 255)
+    assert np.array_equal(out[100:], frame[100:])
@@ -64,8 +64,10 @@
 // are arranged.  If 0, each strip begins on the left for its first row,
 // then goes right to left for its second row, then left to right,
 // zig-zagging for each successive row.
-#define LED_WIDTH      60   // number of LEDs horizontally
-#define LED_HEIGHT     16   // number of LEDs vertically (must be multiple of 8)
+// For the 1593 display each strip is treated as one row of 100 LEDs
+// (MAX_LEDS_PER_STRIP in display1593.py), so ledsPerStrip is 100.
+#define LED_WIDTH      100  // number of LEDs horizontally
+#define LED_HEIGHT     8    // number of LEDs vertically (must be multiple of 8)
 #define LED_LAYOUT     0    // 0 = even rows left->right, 1 = even rows right->left
 
 // The portion of the video image to show on this set of LEDs.  All 4 numbers